@@ -16,6 +16,8 @@ class ConcatenateTokens(Block):
     Detokenize the sentence, spread whitespace correctly.
     """
 
+    required_layers = ['a']
+
     def __init__(self, scenario, args):
         "Constructor, checking the argument values"
         Block.__init__(self, scenario, args)
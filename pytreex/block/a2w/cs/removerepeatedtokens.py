@@ -16,6 +16,8 @@ class RemoveRepeatedTokens(Block):
     Remove two identical neighboring tokens.
     """
 
+    required_layers = []
+
     def __init__(self, scenario, args):
         "Constructor, checking the argument values"
         Block.__init__(self, scenario, args)
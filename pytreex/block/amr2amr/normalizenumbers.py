@@ -27,13 +27,17 @@ class NormalizeNumbers(Block):
             raise LoadingException('Language must be defined!')
 
     def process_amrtree(self, amrtree):
+        removed = []
         for child in amrtree.get_children():
-            self.process_subtree(child)
+            self.process_subtree(child, removed)
+        # nodes are removed without fixing the order, so fix it just once here
+        if removed:
+            amrtree.normalize_order()
 
-    def process_subtree(self, amrnode):
+    def process_subtree(self, amrnode, removed=None):
         # progress depth-first
         for child in amrnode.get_children():
-            self.process_subtree(child)
+            self.process_subtree(child, removed)
         # #Separ is "+"
         if amrnode.concept == '#Separ':
             val = 0
@@ -42,7 +46,7 @@ class NormalizeNumbers(Block):
                 if num is None:
                     continue
                 val += num
-                self.rehang_children_and_remove(child)
+                self.rehang_children_and_remove(child, removed)
             amrnode.concept = str(val)
             log_info('Separ: ' + amrnode.concept)
             return
@@ -53,8 +57,8 @@ class NormalizeNumbers(Block):
                 val = self.get_numeric_value(children[0]) / float(self.get_numeric_value(children[1]))
                 amrnode.concept = str(val)
                 log_info('/: ' + amrnode.concept)
-                self.rehang_children_and_remove(children[0])
-                self.rehang_children_and_remove(children[1])
+                self.rehang_children_and_remove(children[0], removed)
+                self.rehang_children_and_remove(children[1], removed)
             return
         # check if we are a number, normalize our concept name
         val = self.get_numeric_value(amrnode)
@@ -64,7 +68,7 @@ class NormalizeNumbers(Block):
                 num = self.get_numeric_value(child)
                 if num is not None:
                     val *= num
-                    self.rehang_children_and_remove(child)
+                    self.rehang_children_and_remove(child, removed)
                     log_info('Number child: ' + str(num))
             log_info('Number: ' + amrnode.concept)
             amrnode.concept = str(val)
@@ -86,11 +90,16 @@ class NormalizeNumbers(Block):
                 return self.NUM_FOR_WORD[ones] + self.NUM_FOR_WORD[tens]
             return None
 
-    def rehang_children_and_remove(self, amrnode):
+    def rehang_children_and_remove(self, amrnode, removed=None):
         parent = amrnode.parent
         for child in amrnode.get_children():
             child.parent = parent
-        amrnode.remove()
+        # leave fixing the order to the caller if it collects the removed nodes
+        if removed is None:
+            amrnode.remove()
+        else:
+            amrnode.remove(fix_order=False)
+            removed.append(amrnode)
 
 
     NUM_FOR_WORD = {
@@ -35,13 +35,18 @@ class ReadCoNLLU(Block):
         if self.language is None:
             self.language = 'unk'
         self.encoding = args.get('encoding', 'UTF-8')
+        self.gz_threads = int(args.get('gz_threads', 0))
 
     def process_document(self, filename):
         """\
         Read a CoNLL-U file and return its contents as a Document object.
         """
-        fh = file_stream(filename, encoding=self.encoding)
-        doc = Document(filename)
+        fh = file_stream(filename, encoding=self.encoding,
+                         threads=self.gz_threads)
+        doc = Document(filename, projection=self.projection)
+        # just count the sentences if the a-trees are not required
+        if not doc.is_projected(self.language, self.selector, 'a'):
+            return self.read_sentence_bundles(fh, doc)
         bundle = doc.create_bundle()
         zone = bundle.create_zone(self.language, self.selector)
         root = zone.create_atree()
@@ -119,3 +124,26 @@ class ReadCoNLLU(Block):
 
         fh.close()
         return doc
+
+    def read_sentence_bundles(self, fh, doc):
+        """\
+        Create just a bundle for each sentence in the file, skipping the
+        token lines (used if the a-trees are not required by the projection).
+        """
+        in_sentence = False
+        for line in fh:
+            if line.rstrip('\r\n'):
+                in_sentence = True
+            elif in_sentence:
+                self.create_sentence_bundle(doc)
+                in_sentence = False
+        if in_sentence:
+            self.create_sentence_bundle(doc)
+        fh.close()
+        return doc
+
+    def create_sentence_bundle(self, doc):
+        "Create a bundle and the zone (if required by the projection)."
+        bundle = doc.create_bundle()
+        if doc.is_projected(self.language, self.selector):
+            bundle.create_zone(self.language, self.selector)
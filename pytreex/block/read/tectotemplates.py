@@ -40,17 +40,22 @@ class TectoTemplates(Block):
         if self.language is None:
             raise LoadingException('Language must be defined!')
         self.encoding = args.get('encoding', 'UTF-8')
+        self.gz_threads = int(args.get('gz_threads', 0))
 
     def process_document(self, filename):
         """\
         Read a Tecto-Template file and return its contents as
         a Document object.
         """
-        fh = file_stream(filename, encoding=self.encoding)
-        doc = Document(filename)
+        fh = file_stream(filename, encoding=self.encoding,
+                         threads=self.gz_threads)
+        doc = Document(filename, projection=self.projection)
+        load_ttrees = doc.is_projected(self.language, self.selector, 't')
         for line in fh:
             bundle = doc.create_bundle()
             zone = bundle.create_zone(self.language, self.selector)
+            if not load_ttrees:
+                continue
             ttree = zone.create_ttree()
             self.parse_line(line, ttree)
             log_info('Parsed a tree with %d nodes.' %
@@ -17,15 +17,77 @@ __date__ = "2012"
 
 
 class YAML(Block):
+    """\
+    Reader for Treex YAML files.
+
+    Arguments:
+        gz_threads: number of threads for decompressing gzipped files
+        columnar: layers whose trees should be loaded as read-only
+            columnar trees (comma-separated, e.g. "a,t"), for scenarios
+            that only read them
+    """
 
     def __init__(self, scenario, args):
-        "Empty constructor (just call the base constructor)"
+        "Constructor, set up decompression threads if required."
         Block.__init__(self, scenario, args)
+        self.gz_threads = int(args.get('gz_threads', 0))
+        columnar = args.get('columnar', [])
+        if not isinstance(columnar, (list, tuple)):
+            columnar = columnar.split(',')
+        self.columnar = [layer.strip() for layer in columnar if layer.strip()]
 
     def process_document(self, filename):
         "Read a YAML file and return its contents as a Document object"
-        f = file_stream(filename, encoding=None)
-        data = yaml.load(f)
-        doc = Document(filename, data)
+        f = file_stream(filename, encoding=None, threads=self.gz_threads)
+        if self.projection is None:
+            data = yaml.load(f)
+        else:
+            data = self.load_projected(f)
+        doc = Document(filename, data, self.projection, self.columnar)
         f.close()
         return doc
+
+    def load_projected(self, f):
+        """\
+        Load only the zones and trees required by the current projection,
+        skipping the construction of all other YAML data.
+        """
+        loader = yaml.SafeLoader(f)
+        try:
+            root = loader.get_single_node()
+            if root is None:
+                return []
+            return [[zone_data for zone_data in
+                     (self.construct_zone(loader, zone_node)
+                      for zone_node in bundle_node.value)
+                     if zone_data is not None]
+                    for bundle_node in root.value]
+        finally:
+            loader.dispose()
+
+    def construct_zone(self, loader, zone_node):
+        """\
+        Construct the data of a zone from the given YAML node, skipping
+        trees not required by the projection. Return None if the whole
+        zone is not required.
+        """
+        values = dict((key_node.value, value_node)
+                      for key_node, value_node in zone_node.value)
+        language = (loader.construct_object(values['language'])
+                    if 'language' in values else None)
+        selector = (loader.construct_object(values['selector'])
+                    if 'selector' in values else None) or ''
+        if not [True for req_lang, req_sel, _ in self.projection
+                if req_lang == language and req_sel == selector]:
+            return None
+        zone_data = {}
+        for key, value_node in values.items():
+            if key.endswith('tree'):
+                layer = key[:-len('tree')]
+                # AMRs are stored on the t-layer in zones with 'amr' selectors
+                if selector.startswith('amr') and layer == 't':
+                    layer = 'amr'
+                if (language, selector, layer) not in self.projection:
+                    continue
+            zone_data[key] = loader.construct_object(value_node, deep=True)
+        return zone_data
@@ -25,6 +25,8 @@ class AddAuxWords(Block):
         language: the language of the target tree
         selector: the selector of the target tree
     """
+
+    required_layers = ['t', 'a']
     
     def __init__(self, scenario, args):
         "Constructor, just checking the argument values"
@@ -33,6 +35,11 @@ class AddAuxWords(Block):
             raise LoadingException('Language must be defined!')
         
 
+    def process_zone(self, zone):
+        "Process all t-nodes, batching the edits of the a-tree."
+        with zone.atree.batch_edits():
+            Block.process_zone(self, zone)
+
     def process_tnode(self, tnode):
         "Add auxiliary words to the a-layer for a t-node."
         # obtain the surface forms of aux nodes, and quit if there are none
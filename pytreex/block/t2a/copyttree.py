@@ -23,6 +23,8 @@ class CopyTTree(Block):
         selector: the selector of the target zone
     """
 
+    required_layers = ['t', 'a']
+
     def __init__(self, scenario, args):
         "Constructor, checking the argument values"
         Block.__init__(self, scenario, args)
@@ -22,6 +22,8 @@ class AddAuxVerbCompoundFuture(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['t', 'a']
+
     def __init__(self, scenario, args):
         "Constructor, just checking the argument values"
         Block.__init__(self, scenario, args)
@@ -29,6 +31,11 @@ class AddAuxVerbCompoundFuture(Block):
             raise LoadingException('Language must be defined!')
         self.lexicon = Lexicon()
 
+    def process_zone(self, zone):
+        "Process all t-nodes, batching the edits of the a-tree."
+        with zone.atree.batch_edits():
+            Block.process_zone(self, zone)
+
     def process_tnode(self, tnode):
         "Add compound future auxiliary to a node, where appropriate."
         # only future tense + processual aspect or modals
@@ -21,12 +21,19 @@ class AddAuxVerbCompoundPassive(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['t', 'a']
+
     def __init__(self, scenario, args):
         "Constructor, just checking the argument values"
         Block.__init__(self, scenario, args)
         if self.language is None:
             raise LoadingException('Language must be defined!')
 
+    def process_zone(self, zone):
+        "Process all t-nodes, batching the edits of the a-tree."
+        with zone.atree.batch_edits():
+            Block.process_zone(self, zone)
+
     def process_tnode(self, tnode):
         "Add compound passive auxiliary to a node, where appropriate."
         # only apply where appropriate
@@ -23,6 +23,8 @@ class AddAuxVerbCompoundPast(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['t', 'a']
+
     AUX_PAST_FORMS = {('S', '1'): 'jsem',
                       ('S', '2'): 'jsi',
                       ('P', '1'): 'jsme',
@@ -36,6 +38,11 @@ class AddAuxVerbCompoundPast(Block):
         if self.language is None:
             raise LoadingException('Language must be defined!')
 
+    def process_zone(self, zone):
+        "Process all t-nodes, batching the edits of the a-tree."
+        with zone.atree.batch_edits():
+            Block.process_zone(self, zone)
+
     def process_tnode(self, tnode):
         "Add compound past auxiliary to a node, where appropriate."
         aconj = tnode.get_deref_attr('wild/conjugated')
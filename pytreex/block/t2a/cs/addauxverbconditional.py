@@ -23,6 +23,8 @@ class AddAuxVerbConditional(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['t', 'a']
+
     def __init__(self, scenario, args):
         "Constructor, just checking the argument values"
         Block.__init__(self, scenario, args)
@@ -30,6 +32,11 @@ class AddAuxVerbConditional(Block):
             raise LoadingException('Language must be defined!')
         self.lexicon = Lexicon()
 
+    def process_zone(self, zone):
+        "Process all t-nodes, batching the edits of the a-tree."
+        with zone.atree.batch_edits():
+            Block.process_zone(self, zone)
+
     def process_tnode(self, tnode):
         "Add conditional auxiliary to a node, where appropriate."
         # check if we have to add a conditional auxiliary, end if not
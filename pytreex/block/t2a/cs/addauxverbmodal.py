@@ -21,6 +21,8 @@ class AddAuxVerbModal(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['t', 'a']
+
     DEONTMOD_2_MODAL = {'poss': 'moci', 'vol': 'chtít', 'deb': 'muset',
                         'hrt': 'mít', 'fac': 'moci', 'perm': 'moci'}
 
@@ -30,6 +32,11 @@ class AddAuxVerbModal(Block):
         if self.language is None:
             raise LoadingException('Language must be defined!')
 
+    def process_zone(self, zone):
+        "Process all t-nodes, batching the edits of the a-tree."
+        with zone.atree.batch_edits():
+            Block.process_zone(self, zone)
+
     def process_tnode(self, tnode):
         "Add modal auxiliary to a node, where appropriate."
         # check if we have a modal to add, end if not
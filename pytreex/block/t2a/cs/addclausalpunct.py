@@ -22,6 +22,8 @@ class AddClausalPunct(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['a']
+
     def __init__(self, scenario, args):
         "Constructor, just checking the argument values"
         Block.__init__(self, scenario, args)
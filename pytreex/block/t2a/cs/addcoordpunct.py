@@ -23,6 +23,8 @@ class AddCoordPunct(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['a']
+
     def __init__(self, scenario, args):
         "Constructor, just checking the argument values"
         Block.__init__(self, scenario, args)
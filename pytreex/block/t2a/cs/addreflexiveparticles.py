@@ -22,6 +22,8 @@ class AddReflexiveParticles(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['t', 'a']
+
     def __init__(self, scenario, args):
         "Constructor, just checking the argument values"
         Block.__init__(self, scenario, args)
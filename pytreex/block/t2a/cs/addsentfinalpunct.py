@@ -21,6 +21,8 @@ class AddSentFinalPunct(AddClausalPunct):
         selector: the selector of the target tree
     """
 
+    required_layers = ['t', 'a']
+
     def __init__(self, scenario, args):
         "Constructor, just checking the argument values"
         super(AddSentFinalPunct, self).__init__(scenario, args)
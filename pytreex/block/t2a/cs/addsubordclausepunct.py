@@ -5,7 +5,6 @@
 #
 from __future__ import unicode_literals
 
-from builtins import zip
 from pytreex.core.block import Block
 from pytreex.core.exception import LoadingException
 import re
@@ -34,13 +33,9 @@ class AddSubordClausePunct(AddClausalPunct):
 
     def process_atree(self, aroot):
         "Add subordinate clause punctuation to the given sentence."
-        anodes = aroot.get_descendants(ordered=True)
-        # examine all places between two nodes
-        for (aleft, aright) in zip(anodes[:-1], anodes[1:]):
+        # examine all places between two nodes of different clauses
+        for (aleft, aright) in aroot.get_clause_index().get_boundaries():
             # exclude all places where we don't want a comma
-            # within the same clause
-            if aleft.clause_number == aright.clause_number:
-                continue
             # clause boundaries, such as brackets
             if aright.clause_number == 0:
                 continue
@@ -83,7 +78,7 @@ class AddSubordClausePunct(AddClausalPunct):
         alparent = self.get_clause_parent(aleft)
         arparent = self.get_clause_parent(aright)
         return alparent == arparent and \
-                not alparent.is_root and is_coord_conj(alparent.lemma)
+                not alparent.is_root and self.lexicon.is_coord_conj(alparent.lemma)
 
     def get_clause_parent(self, anode):
         """Return the parent of the clause the given node belongs to;
@@ -16,6 +16,8 @@ class CapitalizeSentStart(Block):
     """\
     Capitalize the first word in the sentence (skip punctuation etc.).
     """
+
+    required_layers = ['t', 'a']
     OPEN_PUNCT = r'^[({[‚„«‹|*"\']+$'
 
     def __init__(self, scenario, args):
@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 from pytreex.core.block import Block
 from pytreex.core.exception import LoadingException
+from pytreex.core.node import Node
 import re
 
 __author__ = "Ondřej Dušek"
@@ -16,6 +17,8 @@ class DeleteSuperfluousAuxs(Block):
     Delete repeated prepositions and and conjunctions in coordinations.
     """
 
+    required_layers = ['t', 'a']
+
     DIST_LIMIT = {'v': 5, 'mezi': 50, 'pro': 8, 'protože': 5}
     BASE_DIST_LIMIT = 8
 
@@ -64,4 +67,4 @@ class DeleteSuperfluousAuxs(Block):
             for aux_child in aux.get_children():
                 aux_child.parent = aux.parent
                 aux_child.is_member = aux.is_member
-            aux.remove()
+        Node.remove_many(auxs[1:])
@@ -7,6 +7,7 @@ from __future__ import unicode_literals
 
 from pytreex.core.block import Block
 from pytreex.core.exception import LoadingException
+from pytreex.core.node import Node
 import re
 from pytreex.core.util import first
 from pytreex.core.log import log_warn
@@ -23,6 +24,8 @@ class DropSubjPersProns(Block):
         language: the language of the target tree
         selector: the selector of the target tree
     """
+
+    required_layers = ['t', 'a']
     
     def __init__(self, scenario, args):
         "Constructor, just checking the argument values"
@@ -31,15 +34,25 @@ class DropSubjPersProns(Block):
             raise LoadingException('Language must be defined!')
         
 
+    def process_ttree(self, troot):
+        """\
+        Check all t-nodes of the tree, then remove all the a-nodes
+        to be dropped at once.
+        """
+        to_drop = [self.process_tnode(tnode) for tnode in troot.get_descendants()]
+        Node.remove_many([anode for anode in to_drop if anode is not None])
+
     def process_tnode(self, tnode):
-        "Check if the a-node corresponding to the given t-node should be dropped, and do so where appropriate."
+        """\
+        Check if the a-node corresponding to the given t-node should be dropped;
+        return it if it should (it is removed by process_ttree).
+        """
         # skip nodes to which this should not apply
         if not re.search(r'(:1|drop)$', tnode.formeme) or tnode.is_member:
             return
         # special case: drop "to" under other verbs than "být" or "znamenat"
         if tnode.t_lemma == 'ten' and not tnode.parent.t_lemma in ['být', 'znamenat']:
-            self.drop_anode(tnode)
-            return
+            return self.drop_anode(tnode)
         # skip everything except personal pronouns
         if tnode.t_lemma != '#PersPron':
             return
@@ -57,10 +70,10 @@ class DropSubjPersProns(Block):
                 anode.shift_after_node(anode.parent)
                 return
         # otherwise just drop the personal pronoun
-        self.drop_anode(tnode)
+        return self.drop_anode(tnode)
         
     def drop_anode(self, tnode):
-        "Remove the lexical a-node corresponding to the given t-node"
+        "Prepare the lexical a-node corresponding to the given t-node for removal, return it."
         anode = tnode.lex_anode
         if not anode:
             log_warn("Can't find a-node to be dropped:" + tnode.id)
@@ -68,6 +81,6 @@ class DropSubjPersProns(Block):
         # this should not happen, but just to be sure - rehang children
         for achild in anode.get_children():
             achild.parent = anode.parent
-        # remove the node itself
-        anode.remove()
+        # the node itself is removed in process_ttree, after all t-nodes are checked
+        return anode
         
\ No newline at end of file
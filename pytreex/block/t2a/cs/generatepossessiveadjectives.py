@@ -26,6 +26,8 @@ class GeneratePossessiveAdjectives(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['t', 'a']
+
     def __init__(self, scenario, args):
         """\
         Constructor, just checking the argument values.
@@ -29,6 +29,8 @@ class GenerateWordForms(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['a']
+
     BACK_REGEX = re.compile(r'^>([0-9]+)(.*)$')
 
     def __init__(self, scenario, args):
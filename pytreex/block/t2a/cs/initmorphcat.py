@@ -24,6 +24,8 @@ class InitMorphcat(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['t', 'a']
+
     GENDER = {None: '.', 'anim': 'M', 'inan': 'I', 'fem': 'F',
               'neut': 'N', 'nr': '.', 'inher': '.'}
     NUMBER = {None: '.', 'sg': 'S', 'pl': 'P', 'nr': '.', 'inher': '.'}
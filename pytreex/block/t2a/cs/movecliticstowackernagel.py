@@ -17,6 +17,8 @@ class MoveCliticsToWackernagel(Block):
     in the clause.
     """
 
+    required_layers = ['a']
+
     def __init__(self, scenario, args):
         "Constructor, checking the argument values"
         Block.__init__(self, scenario, args)
@@ -28,15 +30,12 @@ class MoveCliticsToWackernagel(Block):
         Process the individual clauses -- find and move clitics within them.
         """
         # Divide nodes into clauses
-        clauses = {}
-        for anode in aroot.get_descendants(ordered=True):
-            if not anode.clause_number:
-                continue
-            clause = clauses.get(anode.clause_number, [])
-            clauses[anode.clause_number] = clause
-            clause.append(anode)
+        clause_index = aroot.get_clause_index()
+        clauses = [clause_index.get_members(clause_number)
+                   for clause_number in clause_index.get_clause_numbers()
+                   if clause_number]
         # Process all clauses
-        for clause in clauses.values():
+        for clause in clauses:
             self.process_clause(clause)
 
     def process_clause(self, clause):
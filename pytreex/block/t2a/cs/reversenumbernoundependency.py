@@ -23,6 +23,8 @@ class ReverseNumberNounDependency(Block):
         selector: the selector of the target tree
     """
 
+    required_layers = ['t', 'a']
+
     def __init__(self, scenario, args):
         "Constructor, checking the argument values"
         Block.__init__(self, scenario, args)
@@ -19,6 +19,8 @@ class VocalizePrepos(Block):
     to the following word.
     """
 
+    required_layers = ['a']
+
     def __init__(self, scenario, args):
         "Constructor, checking the argument values"
         Block.__init__(self, scenario, args)
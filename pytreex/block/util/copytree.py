@@ -7,7 +7,6 @@ from __future__ import unicode_literals
 
 from pytreex.core.block import Block
 from pytreex.core.exception import LoadingException, RuntimeException
-import copy
 
 __author__ = "Ondřej Dušek"
 __date__ = "2012"
@@ -41,6 +40,11 @@ class CopyTree(Block):
         if not self.layer:
             raise LoadingException('Can\'t copy tree: layer must be given!')
         
+    def get_required_zones(self):
+        "Require the source and target tree on the given layer."
+        return set([(self.source_language, self.source_selector, self.layer),
+                    (self.language, self.selector, self.layer)])
+
     def process_bundle(self, bundle):
         "For each bundle, copy the tree on the given layer in the given zone to another zone."
         if not bundle.has_zone(self.source_language, self.source_selector):
@@ -50,17 +54,4 @@ class CopyTree(Block):
         if not source_zone.has_tree(self.layer):
             raise RuntimeException('Source zone does not have a tree at ' + self.layer + '-layer')
         source_tree = source_zone.get_tree(self.layer)
-        target_tree = target_zone.create_tree(self.layer)
-        self.copy_subtree(source_tree, target_tree)
-        
-    def copy_subtree(self, source_root, target_root):
-        "Deep-copy a subtree, creating nodes with the same attributes, but different IDs"
-        # copy the current node
-        for attrib_name in source_root.get_attr_list():
-            target_root.set_attr(attrib_name, copy.deepcopy(source_root.get_attr(attrib_name)))
-        # copy all children
-        for child in source_root.get_children():
-            self.copy_subtree(child, target_root.create_child()) 
-        
-        
-        
\ No newline at end of file
+        source_tree.clone_subtree(zone=target_zone)
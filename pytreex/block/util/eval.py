@@ -6,7 +6,7 @@
 from __future__ import unicode_literals
 
 from pytreex.core.block import Block
-from pytreex.core.exception import LoadingException
+from pytreex.core.exception import LoadingException, RuntimeException
 
 __author__ = "Ondřej Dušek"
 __date__ = "2012"
@@ -16,58 +16,105 @@ class Eval(Block):
     """
     This block executes arbitrary Python code for each document/bundle or each zone/tree/node matching the
     current language and selector.
-    
+
     Arguments:
         document, bundle, zone, atree, anode, ttree, tnode, ntree, nnode, ptree, pnode: code to execute
             for each <name of the argument>
-            
+        function: if set to 1, the arguments are expressions giving functions (e.g. lambdas), which are
+            called with each <name of the argument> instead
+
     Arguments may be combined, but at least one of them must be set. If only X<tree/node> are set,
-    language and selector is required.    
-    """    
-    
+    language and selector is required.
+
+    All code is compiled once, when the block is loaded. It is executed in a new namespace for each
+    document, where 'self', 'doc' and 'document', 'bundle', 'zone', 'layer', 'Xtree', 'node' and 'Xnode'
+    are set to the currently processed objects; other variables assigned by the code are kept
+    between executions for the same document. Functions only get the processed object (and 'self').
+    """
+
     # list of valid arguments to be cheked in the constructor
-    valid_args = ['document', 'doc', 'bundle', 'zone', 'atree', 'anode', 
+    valid_args = ['document', 'doc', 'bundle', 'zone', 'atree', 'anode',
                   'ttree', 'tnode', 'ntree', 'nnode', 'ptree', 'pnode']
 
     def __init__(self, scenario, args):
-        "Constructor, checking the argument values"
+        "Constructor, checking the argument values and compiling the code"
         Block.__init__(self, scenario, args)
-        # just check if there is any valid argument in the argument dictionary 
+        # just check if there is any valid argument in the argument dictionary
         if not [True for arg in list(args.keys()) if arg in self.__class__.valid_args]:
-            raise LoadingException('No valid argument given (document, bundle, zone, X(tree|node)')        
-    
-        
+            raise LoadingException('No valid argument given (document, bundle, zone, X(tree|node)')
+        self.function = bool(int(args.get('function', 0)))
+        self.namespace = {'self': self}
+        self.code = {}
+        for arg in self.__class__.valid_args:
+            if args.get(arg):
+                self.code[arg] = self.__compile(arg, args[arg])
+        if 'document' not in self.code and 'doc' in self.code:
+            self.code['document'] = self.code['doc']
+
+    def __compile(self, arg, code):
+        "Compile the code of the given argument (and get the function in function mode)"
+        filename = '<Util.Eval %s>' % arg
+        try:
+            if self.function:
+                return eval(compile(code, filename, 'eval'), self.namespace)
+            return compile(code, filename, 'exec')
+        except SyntaxError as e:
+            raise LoadingException('Cannot compile the %s code: %s' % (arg, e))
+
+    def __execute(self, arg, obj, namespace):
+        "Execute the code of the given argument for the given object, already in the namespace"
+        if self.function:
+            self.code[arg](obj)
+        else:
+            exec(self.code[arg], namespace)
+
     def process_document(self, doc):
         "Process a document (execute code from the 'document' argument and dive deeper)"
-        code = self.args.get('document') or self.args.get('doc')
-        if code is not None: 
-            document = doc # provide the same variable under two names
-            exec(code)
+        # a new namespace for each document, so that documents may be processed in parallel
+        # (provide the same variable under two names)
+        namespace = dict(self.namespace, doc=doc, document=doc)
+        if 'document' in self.code:
+            self.__execute('document', doc, namespace)
         # process all bundles
-        super(Eval, self).process_document(doc)
-    
-    
-    def process_bundle(self, bundle):
+        for bundle in doc.bundles:
+            self.process_bundle(bundle, namespace)
+
+    def process_bundle(self, bundle, namespace=None):
         "Process a document (execute code from the 'bundle' argument and dive deeper)"
-        code = self.args.get('bundle')
-        if code is not None: exec(code)
-        super(Eval, self).process_bundle(bundle)
-        
-    def process_zone(self, zone):
+        if namespace is None:
+            namespace = dict(self.namespace)
+        namespace['bundle'] = bundle
+        if 'bundle' in self.code:
+            self.__execute('bundle', bundle, namespace)
+        if self.language is None:
+            raise RuntimeException('Undefined language')
+        self.process_zone(bundle.get_zone(self.language, self.selector), namespace)
+
+    def process_zone(self, zone, namespace=None):
         "Process a zone (according to language and selector; execute code for the zone or X<tree|node>) arguments)"
+        if namespace is None:
+            namespace = dict(self.namespace)
+        namespace['zone'] = zone
         # code for the whole zone
-        code = self.args.get('zone')
-        if code is not None: exec(code)
-        # trees/nodes        
+        if 'zone' in self.code:
+            self.__execute('zone', zone, namespace)
+        # trees/nodes
         for layer in ['a', 't', 'n', 'p']:
+            namespace['layer'] = layer
             # code for Xtree
-            code = self.args.get(layer + 'tree')
-            if code is not None:
-                exec(layer + 'tree = zone.get_tree(layer)' + "\n" + code)
+            if layer + 'tree' in self.code:
+                tree = namespace[layer + 'tree'] = zone.get_tree(layer)
+                self.__execute(layer + 'tree', tree, namespace)
             # code for Xnode
-            code = self.args.get(layer + 'node')
-            if code is not None:
-                for node in zone.get_tree(layer).get_descendants():
-                    exec(layer + 'node = node' + "\n" + code)
-        
-    
\ No newline at end of file
+            code = self.code.get(layer + 'node')
+            if code is None:
+                continue
+            name = layer + 'node'
+            nodes = zone.get_tree(layer).get_descendants()
+            if self.function:
+                for node in nodes:
+                    code(node)
+            else:
+                for node in nodes:
+                    namespace['node'] = namespace[name] = node
+                    exec(code, namespace)
@@ -21,6 +21,10 @@ class SetGlobal(Block):
         for arg, value in args.items():
             scenario.global_args[arg] = value
 
+    def get_required_zones(self):
+        "This block does not need any data."
+        return set()
+
     def process_bundle(self, doc):
         """\
         This block does nothing with the documents, its only work
@@ -7,14 +7,29 @@ from __future__ import unicode_literals
 from pytreex.core.block import Block
 
 import os
+import codecs
 from pytreex.core.exception import RuntimeException
+from pytreex.core.util import file_stream, ArchiveShardWriter
 
 __author__ = "Ondřej Dušek"
 __date__ = "2012"
 
 
 class BaseWriter(Block):
-    "Base block for output writing."
+    """\
+    Base block for output writing.
+
+    Arguments:
+        to: the output file name
+        path: the output directory (file names are taken from the documents)
+        add_to_name: string to add to the input file names
+        archive: pack all outputs into .tar(.gz)/.zip archive shards named
+            after this template (out.tar.gz -> out-00001.tar.gz, ...);
+            the output file names, relative to the output directory
+            (or the input file's directory), are then used as member names
+        shard_size: maximum size of an archive shard in bytes (default: 1G)
+        gz_threads: number of threads for compressing .gz outputs
+    """
 
     def __init__(self, scenario, args):
         "Empty constructor (just call the base constructor)"
@@ -22,6 +37,12 @@ class BaseWriter(Block):
         self.to = None
         self.path = None
         self.add_to_name = None
+        # number of threads used for compressing .gz outputs (0 = no threads)
+        self.gz_threads = int(args.get('gz_threads', 0))
+        self.archive = None
+        if 'archive' in args:
+            self.archive = ArchiveShardWriter(args['archive'],
+                                              int(args.get('shard_size', 1 << 30)))
         if 'to' in args:
             self.to = args['to']
         elif 'path' in args:
@@ -51,3 +72,40 @@ class BaseWriter(Block):
             return docfilename + self.__class__.default_extension + compress_e
         # no default, just die
         raise RuntimeException('I don\'t know where to write.')
+
+    def get_output_stream(self, doc, encoding='UTF-8'):
+        """\
+        Open an output stream for the given document (a file, or a member
+        of the current archive shard).
+        """
+        filename = self.get_output_file_name(doc)
+        if self.archive is None:
+            return file_stream(filename, 'w', encoding=encoding,
+                               threads=self.gz_threads)
+        fh = self.archive.open(self.get_member_name(doc, filename))
+        if encoding is not None:
+            fh = codecs.getwriter(encoding)(fh)
+        return fh
+
+    def get_member_name(self, doc, filename):
+        """\
+        Return the archive member name for the given document and output
+        file name: relative to the output directory (or the directory of
+        the input file or output file given), with no '..' components.
+        """
+        if self.to:
+            base_dir = os.path.dirname(self.to)
+        elif self.path:
+            base_dir = self.path
+        else:
+            base_dir = os.path.dirname(doc.filename)
+        name = os.path.relpath(filename, base_dir or os.curdir)
+        name = name.replace(os.sep, '/')
+        if os.path.isabs(name) or '..' in name.split('/'):
+            raise RuntimeException('Invalid archive member name: ' + name)
+        return name
+
+    def process_end(self):
+        "Close the last archive shard, if applicable."
+        if self.archive is not None:
+            self.archive.close()
@@ -7,9 +7,10 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-from builtins import map
-from builtins import str
+from operator import attrgetter
 from pytreex.block.write.basewriter import BaseWriter
+from pytreex.core.exception import RuntimeException
+from pytreex.core.node import Ordered
 from pytreex.core.util import file_stream
 
 __author__ = "Martin Popel"
@@ -17,31 +18,93 @@ __date__ = "2015"
 
 
 class WriteCoNLLU(BaseWriter):
+    """\
+    Writer for CoNLL-U format used in Universal Dependencies.
+
+    The output is formatted into a buffer and written in large chunks. The
+    writer may also be driven per bundle (streaming mode), using
+    open_output(), process_bundle() and close_output().
+
+    Arguments:
+        language: the language of the a-trees to write
+        selector: the selector of the a-trees to write
+        buffer_size: approximate size of output chunks in characters
+            (defaults to 1M)
+    """
 
     default_extension = '.conllu'
+    required_layers = ['a']
+
+    # all columns except ID and HEAD, which are computed
+    get_columns = attrgetter('form', 'lemma', 'upos', 'xpos', 'feats',
+                             'deprel', 'deps', 'misc')
+    # ID is the position in the sentence, HEAD the parent's ord as it is
+    # (ords may be unset, or fractional inside edit batches)
+    ROW_FORMAT = '%d\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n'
 
     def __init__(self, scenario, args):
-        "Empty constructor (just call the base constructor)"
+        "Constructor, just set buffering parameters"
         BaseWriter.__init__(self, scenario, args)
+        self.buffer_size = int(args.get('buffer_size', 1 << 20))
+        self.out = None
+        self.buffer = []
+        self.buffered = 0
 
     def process_document(self, doc):
         "Write a CoNLL-U file"
-        out = file_stream(self.get_output_file_name(doc), 'w', encoding='UTF-8')
+        self.out = self.get_output_stream(doc, encoding='UTF-8')
         for bundle in doc.bundles:
-            zone = bundle.get_zone(self.language, self.selector)
-            nodes = zone.atree.get_descendants(ordered=1)
-            # Empty sentences are not allowed in CoNLL-U.
-            if len(nodes)==0:
-                continue
-            comment = zone.wild['comment']
-            if comment:
-                out.write('#' + comment.rstrip('\r\n').replace('\n','\n#') + '\n')
-            index = 1
-            for node in nodes:
-                out.write('\t'.join(
-                    '_' if value is None else value for value in
-                    map((lambda x: str(x) if type(x)==int else getattr(node, x, '_')),
-                        [index, 'form', 'lemma', 'upos', 'xpos', 'feats', node.parent.ord, 'deprel', 'deps', 'misc'])
-                ) + '\n')
-                index += 1
-            out.write('\n')
+            self.process_bundle(bundle)
+        self.close_output()
+
+    def open_output(self, filename):
+        "Open the given output file (or stream) for writing bundles."
+        self.out = file_stream(filename, 'w', encoding='UTF-8',
+                               threads=self.gz_threads)
+
+    def process_bundle(self, bundle):
+        """\
+        Format the a-tree of the given bundle into the output buffer,
+        flushing it if it is full.
+        """
+        if self.out is None:
+            raise RuntimeException('CoNLL-U output is not open')
+        zone = bundle.get_zone(self.language, self.selector)
+        # sorting by key is much faster than using node comparison
+        nodes = zone.atree.get_descendants()
+        nodes.sort(key=Ordered.order_key)
+        # Empty sentences are not allowed in CoNLL-U.
+        if not nodes:
+            return
+        lines = []
+        comment = zone.wild.get('comment')
+        if comment:
+            lines.append('#' + comment.rstrip('\r\n').replace('\n', '\n#') + '\n')
+        get_columns = self.get_columns
+        row_format = self.ROW_FORMAT
+        for index, node in enumerate(nodes, start=1):
+            form, lemma, upos, xpos, feats, deprel, deps, misc = [
+                '_' if value is None else value for value in get_columns(node)]
+            head = node.parent.ord
+            lines.append(row_format % (index, form, lemma, upos, xpos, feats,
+                                       '_' if head is None else head,
+                                       deprel, deps, misc))
+        lines.append('\n')
+        chunk = ''.join(lines)
+        self.buffer.append(chunk)
+        self.buffered += len(chunk)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        "Write out all buffered output."
+        if self.buffer:
+            self.out.write(''.join(self.buffer))
+        self.buffer = []
+        self.buffered = 0
+
+    def close_output(self):
+        "Flush the buffer and close the current output."
+        self.flush()
+        self.out.close()
+        self.out = None
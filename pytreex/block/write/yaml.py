@@ -10,8 +10,8 @@ from __future__ import unicode_literals
 import yaml
 from pytreex.block.write.basewriter import BaseWriter
 import types
-from pytreex.core.util import file_stream
 from pytreex.core.node import AMR
+from pytreex.core.features import FeatureBundle
 
 __author__ = "Ondřej Dušek"
 __date__ = "2012"
@@ -30,7 +30,7 @@ class YAML(BaseWriter):
         data = []
         for bundle in doc.bundles:
             data.append(self.serialize_bundle(bundle))
-        out = file_stream(self.get_output_file_name(doc), 'w', encoding=None)
+        out = self.get_output_stream(doc, encoding=None)
         out.write(yaml.safe_dump(data, allow_unicode=True,
                                  explicit_start=True).encode('utf-8'))
         out.close()
@@ -67,8 +67,15 @@ class YAML(BaseWriter):
         tree type given. Add the node parent's id if needed.
         """
         data = {'id': node.id}
+        # attributes holding references need their IDs rendered as strings
+        ref_attrs = node.get_ref_attr_list(split_nested=True)
         for attr in node.get_attr_list():
-            value = node.get_attr(attr)
+            if attr in ref_attrs or attr == 'alignment':
+                value = node.get_rendered_attr(attr)
+            else:
+                value = node.get_attr(attr)
+            if isinstance(value, FeatureBundle):
+                value = value.to_dict()
             # write all non-nulls, but skip empty dictionaries and lists
             if value is not None and \
                     ((type(value) != dict and
@@ -13,7 +13,20 @@ __date__ = "2012"
 
 
 class Block(object):
-    "A common ancestor to all Treex processing blocks."
+    """\
+    A common ancestor to all Treex processing blocks.
+
+    A block may process several documents at once in parallel threads (see
+    Scenario.apply_to_files), so any per-document state should be kept in
+    local variables rather than in the block object.
+    """
+
+    # layers of its zone this block reads or writes (None means the block
+    # may need any data in the document; to be overridden by child blocks)
+    required_layers = None
+    # (language, selector, layer) triples a reader should load (None means
+    # everything; set by the scenario for the first block)
+    projection = None
 
     def __init__(self, scenario, args):
         "Constructor, to be overridden by child blocks."
@@ -21,11 +34,39 @@ class Block(object):
         self.args = args
         self.language = args.get("language", None)
         self.selector = args.get("selector", '')
+        # explicit declaration of layers used, e.g. "layers: t,a"
+        if 'layers' in args:
+            layers = args['layers']
+            if not isinstance(layers, (list, tuple)):
+                layers = layers.split(',')
+            self.required_layers = [layer.strip() for layer in layers
+                                    if layer.strip()]
 
     def load(self):
         "Load required files / models, to be overridden by child blocks."
         pass
 
+    def get_required_zones(self):
+        """\
+        Return a set of (language, selector, layer) triples this block reads
+        or writes, or None if it may need any data in the document. A triple
+        with layer set to None requires just the zone itself (e.g. its
+        sentence).
+        """
+        if self.required_layers is None or self.language is None:
+            return None
+        if not self.required_layers:
+            return set([(self.language, self.selector, None)])
+        return set((self.language, self.selector, layer)
+                   for layer in self.required_layers)
+
+    def process_end(self):
+        """\
+        Finish processing after all documents have been processed (e.g. close
+        output files), to be overridden by child blocks.
+        """
+        pass
+
     def process_document(self, doc):
         """\
         Process a document. Default behavior is to look for methods that
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Columnar storage of trees with lightweight node views
+#
+from __future__ import unicode_literals
+from builtins import str
+from builtins import zip
+from builtins import range
+from builtins import object
+from future.utils import native_str
+from array import array
+from pytreex.core.exception import RuntimeException
+from pytreex.core.features import FeatureBundleMeta
+from pytreex.core.node import Node, Ordered, A, T
+
+
+class ColumnarTree(object):
+    """\
+    A read-only tree stored column-wise: the parent index and ord of all
+    nodes in compact arrays, and one column (list or array) per node
+    attribute. The nodes are kept in depth-first order, root first, so any
+    subtree is a continuous range of nodes.
+
+    The nodes are accessed through NodeView objects, which provide the
+    reading API of Node. They are indexed in the document in place of nodes,
+    so references to and from the tree keep working.
+
+    The tree is built from data (as loaded from files) or from an existing
+    tree, and may be turned back into data for creating ordinary nodes (see
+    Zone.to_columnar and Zone.from_columnar).
+    """
+
+    # node classes of the supported layers
+    node_classes = {'a': A, 't': T}
+    # view classes for the node classes (see get_view_class)
+    view_classes = {}
+    # stored in place of ord for nodes that have no ord set
+    NO_ORD = -1
+
+    def __init__(self, layer, zone=None):
+        "Constructor, create an empty tree on the given layer."
+        if layer not in self.node_classes:
+            raise RuntimeException('Columnar trees are not supported on layer: ' + layer)
+        self.layer = layer
+        self.zone = zone
+        self.node_class = self.node_classes[layer]
+        # a bare node instance, for the attribute lists of the node class
+        self.prototype = self.node_class.__new__(self.node_class)
+        self.attrs = [(attr, safe_attr, atype) for (attr, atype), safe_attr
+                      in zip(self.prototype.get_attr_list(include_types=True),
+                             self.prototype.get_attr_list(safe=True))
+                      if attr != 'ord']
+        self.safe_names = dict((attr, safe_attr) for attr, safe_attr, _ in self.attrs)
+        self.bool_attrs = set(safe_attr for _, safe_attr, atype in self.attrs
+                              if atype == bool)
+        self.ids = []
+        self.parents = array('l')
+        self.ords = array('l')
+        self.columns = dict((safe_attr, array('b') if safe_attr in self.bool_attrs else [])
+                            for _, safe_attr, _ in self.attrs)
+        self.view_class = self.get_view_class(self.node_class, self.attrs)
+        self.views = []
+        self.__subtree_ends = None
+        self.__children = None
+
+    @classmethod
+    def from_data(cls, layer, data, zone=None):
+        """\
+        Build a tree from data, i.e. a dictionary of the root's attributes,
+        with all the other nodes in a list under 'nodes' (each of them with
+        the id of its parent under 'parent_id').
+        """
+        tree = cls(layer, zone)
+        nodes_data = data.get('nodes') or []
+        children = {}
+        for node_data in nodes_data:
+            children.setdefault(node_data['parent_id'], []).append(node_data)
+        stack = [(data, -1)]
+        while stack:
+            node_data, parent = stack.pop()
+            node_id = node_data.get('id') or tree.__generate_id()
+            index = tree.__append(node_id, parent, node_data.get)
+            stack.extend((child_data, index) for child_data
+                         in reversed(children.get(node_id, [])))
+        if len(tree.ids) != len(nodes_data) + 1:
+            raise RuntimeException('Some nodes are not connected to the tree root ' +
+                                   str(tree.ids[0]))
+        tree.__index_views()
+        return tree
+
+    @classmethod
+    def from_tree(cls, root, zone=None):
+        "Build a tree from an existing tree of nodes, given its root."
+        # (nodes tracking attribute changes have a subclass, see Node._set_tracked)
+        root_class = getattr(type(root), '_untracked_class', type(root))
+        layers = [layer for layer, node_class in cls.node_classes.items()
+                  if root_class is node_class]
+        if not layers:
+            raise RuntimeException('Columnar trees are not supported for ' +
+                                   root_class.__name__ + ' nodes')
+        tree = cls(layers[0], zone or root.zone)
+        stack = [(root, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = tree.__append(node.ref_id, parent, node.get_attr)
+            stack.extend((child, index) for child in reversed(node.get_children()))
+        tree.__index_views()
+        return tree
+
+    @classmethod
+    def get_view_class(cls, node_class, attrs):
+        """\
+        Return the class of views of nodes of the given class (with the given
+        (name, safe name, type) attributes): a NodeView with a property for
+        each attribute column and all the properties of the node class.
+        """
+        view_class = cls.view_classes.get(node_class)
+        if view_class is None:
+            members = {'__slots__': [], 'node_class': node_class}
+            for klass in reversed(node_class.__mro__):
+                members.update((name, value) for name, value in klass.__dict__.items()
+                               if isinstance(value, property) and
+                               not hasattr(NodeView, name))
+            for _, safe_attr, atype in attrs:
+                members[safe_attr] = NodeView.column_property(safe_attr, atype)
+            view_class = type(native_str('%sView' % node_class.__name__), (NodeView,), members)
+            # (creating it twice in parallel threads does no harm)
+            cls.view_classes[node_class] = view_class
+        return view_class
+
+    def __generate_id(self):
+        "Generate an ID for a node that has none in data."
+        if self.zone is None or self.zone.bundle is None:
+            raise RuntimeException('Nodes of columnar trees outside bundles need IDs')
+        return self.zone.bundle.generate_node_id()
+
+    def __append(self, node_id, parent, get_value):
+        """\
+        Add a node with the given ID and parent index, taking its attribute
+        values from the given function. Return the index of the new node.
+        """
+        index = len(self.ids)
+        self.ids.append(node_id)
+        self.parents.append(parent)
+        value = get_value('ord')
+        if value is None and parent < 0:  # roots have ord 0 by default
+            value = 0
+        self.ords.append(self.NO_ORD if value is None else int(value))
+        # coerce the values in the same way as Node's constructor
+        categorical = self.prototype.get_categorical_attrs()
+        symbols = Node.symbols
+        for attr, safe_attr, atype in self.attrs:
+            value = get_value(attr)
+            if safe_attr in self.bool_attrs:
+                value = value is not None and bool(int(value))
+            elif value is None:
+                pass
+            elif atype == dict:
+                value = dict(value) or None
+                if value is not None and attr in categorical:
+                    symbols.intern_values(value)
+            elif atype == list:
+                value = list(value) or None
+            elif type(atype) is FeatureBundleMeta:
+                value = atype(value) or None
+            else:
+                value = atype(value)
+                if attr in categorical:
+                    value = symbols.intern(value)
+            self.columns[safe_attr].append(value)
+        return index
+
+    def __index_views(self):
+        "Create views of all nodes, index them in the document."
+        view_class = self.view_class
+        self.views = [view_class(self, index) for index in range(len(self.ids))]
+        document = self.zone.document if self.zone is not None else None
+        if document is not None:
+            for view in self.views:
+                document.index_node(view)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def root(self):
+        "The view of the root of the tree."
+        return self.views[0]
+
+    def get_subtree_end(self, index):
+        "Return the index following the last node of the given node's subtree."
+        if self.__subtree_ends is None:
+            ends = array('l', range(1, len(self.ids) + 1))
+            # children follow their parents, so their subtrees end first
+            for child in range(len(self.ids) - 1, 0, -1):
+                parent = self.parents[child]
+                if ends[child] > ends[parent]:
+                    ends[parent] = ends[child]
+            self.__subtree_ends = ends
+        return self.__subtree_ends[index]
+
+    def get_children_indexes(self, index):
+        "Return the indexes of the children of the given node."
+        if self.__children is None:
+            children = [[] for _ in self.ids]
+            for child in range(1, len(self.ids)):
+                children[self.parents[child]].append(child)
+            self.__children = children
+        return self.__children[index]
+
+    def _pack(self, strings):
+        """\
+        Return the tree flattened for pickling: the layer, IDs, parents, ords
+        and attribute columns, packed as those of nodes (see Node._pack_tree).
+        """
+        columns = []
+        for _, safe_attr, atype in self.attrs:
+            column = self.columns[safe_attr]
+            if safe_attr not in self.bool_attrs:
+                column = Node._pack_column(list(column), atype, strings)
+            columns.append(column)
+        return self.layer, self.ids, self.parents, self.ords, columns
+
+    @classmethod
+    def _unpack(cls, state, zone, strings):
+        "Rebuild a tree packed by _pack in the given zone, indexing its views."
+        layer, ids, parents, ords, columns = state
+        tree = cls(layer, zone)
+        tree.ids = list(ids)
+        tree.parents = parents
+        tree.ords = ords
+        categorical = tree.prototype.get_categorical_attrs()
+        for (attr, safe_attr, atype), column in zip(tree.attrs, columns):
+            if safe_attr not in tree.bool_attrs:
+                # (columns of defaults are columns of None, see __append)
+                column = ([None] * len(tree.ids) if column is None else
+                          Node._unpack_column(column, atype, strings, attr in categorical))
+            tree.columns[safe_attr] = column
+        tree.__index_views()
+        return tree
+
+    def to_data(self):
+        "Return the data of the tree, as accepted by Zone.create_tree."
+        nodes = []
+        for index in range(len(self.ids)):
+            node_data = {'id': self.ids[index]}
+            if self.ords[index] != self.NO_ORD:
+                node_data['ord'] = self.ords[index]
+            for attr, safe_attr, _ in self.attrs:
+                value = self.columns[safe_attr][index]
+                if value is not None:
+                    node_data[attr] = value
+            if index:
+                node_data['parent_id'] = self.ids[self.parents[index]]
+            nodes.append(node_data)
+        data = nodes[0]
+        data['nodes'] = nodes[1:]
+        return data
+
+
+class NodeView(object):
+    """\
+    A lightweight read-only view of one node of a ColumnarTree, with the
+    same reading API as Node: attributes (read from the tree's columns),
+    references, tree structure and ordering. Views of nodes of each class
+    have a class of their own (see ColumnarTree.get_view_class), so the
+    properties of the node class (such as A.morphcat_pos) work on them, too.
+    """
+
+    __slots__ = ['tree', 'index']
+
+    def __init__(self, tree, index):
+        object.__setattr__(self, 'tree', tree)
+        object.__setattr__(self, 'index', index)
+
+    @staticmethod
+    def column_property(safe_attr, atype):
+        "Return a property reading the given attribute column."
+        if atype == bool:
+            def get_value(view):
+                return bool(view.tree.columns[safe_attr][view.index])
+        elif atype in (dict, list) or type(atype) is FeatureBundleMeta:
+            # empty containers are not stored, but created on request
+            def get_value(view):
+                value = view.tree.columns[safe_attr][view.index]
+                return atype() if value is None else value
+        else:
+            def get_value(view):
+                return view.tree.columns[safe_attr][view.index]
+        return property(get_value)
+
+    def __setattr__(self, name, value):
+        raise RuntimeException('Columnar trees are read-only (see Zone.from_columnar)')
+
+    def __repr__(self):
+        return '<%s view %s>' % (self.tree.node_class.__name__, self.id)
+
+    @property
+    def id(self):
+        "The ID of the node, as a string (see Node.id)."
+        node_id = self.tree.ids[self.index]
+        if isinstance(node_id, int):
+            return self.tree.node_class._render_generated_id(self.tree.zone, node_id)
+        return node_id
+
+    @property
+    def ref_id(self):
+        "The ID of the node as used in references (see Node.ref_id)."
+        return self.tree.ids[self.index]
+
+    @property
+    def ord(self):
+        value = self.tree.ords[self.index]
+        return None if value == ColumnarTree.NO_ORD else value
+
+    @property
+    def parent(self):
+        parent = self.tree.parents[self.index]
+        return self.tree.views[parent] if parent >= 0 else None
+
+    @property
+    def root(self):
+        return self.tree.views[0]
+
+    @property
+    def is_root(self):
+        return self.index == 0
+
+    @property
+    def zone(self):
+        return self.tree.zone
+
+    @property
+    def document(self):
+        return self.tree.zone.document if self.tree.zone is not None else None
+
+    def get_attr_list(self, include_types=False, safe=False):
+        return self.tree.prototype.get_attr_list(include_types, safe)
+
+    def get_ref_attr_list(self, split_nested=False):
+        return self.tree.prototype.get_ref_attr_list(split_nested)
+
+    def get_categorical_attrs(self):
+        return self.tree.prototype.get_categorical_attrs()
+
+    def get_attr(self, name):
+        """Return the value of the given attribute.
+        Allows for dictionary nesting, e.g. 'morphcat/gender'"""
+        tree = self.tree
+        if '/' in name:
+            attr, path = name.split('/', 1)
+            obj = self.get_attr(attr)
+            for step in path.split('/'):
+                if not hasattr(obj, 'get'):
+                    return None
+                obj = obj.get(step)
+            return obj
+        return getattr(self, tree.safe_names.get(name, name))
+
+    def get_children(self, add_self=False, ordered=False,
+                     preceding_only=False, following_only=False):
+        "Return all children of the node"
+        views = self.tree.views
+        return self._process_switches([views[child] for child
+                                       in self.tree.get_children_indexes(self.index)],
+                                      add_self, ordered, preceding_only, following_only)
+
+    def get_descendants(self, add_self=False, ordered=False,
+                        preceding_only=False, following_only=False, except_subtree=None):
+        "Return all topological descendants of this node."
+        tree = self.tree
+        end = tree.get_subtree_end(self.index)
+        if except_subtree is None or except_subtree.tree is not tree:
+            nodes = tree.views[self.index + 1:end]
+        elif except_subtree is self:
+            return []
+        else:
+            skip_from = except_subtree.index
+            skip_to = tree.get_subtree_end(skip_from)
+            nodes = [view for view in tree.views[self.index + 1:end]
+                     if not skip_from <= view.index < skip_to]
+        return self._process_switches(nodes, add_self, ordered,
+                                      preceding_only, following_only)
+
+    def is_descendant_of(self, another_node):
+        "Is this node a descendant of another node?"
+        return (isinstance(another_node, NodeView) and another_node.tree is self.tree and
+                another_node.index < self.index <
+                self.tree.get_subtree_end(another_node.index))
+
+    # the other reading methods of nodes work on views as they are
+    get_deref_attr = Node.__dict__['get_deref_attr']
+    get_referenced_ids = Node.__dict__['get_referenced_ids']
+    get_rendered_attr = Node.__dict__['get_rendered_attr']
+    get_aligned_nodes = Node.__dict__['get_aligned_nodes']
+    get_depth = Node.__dict__['get_depth']
+    _process_switches = Node.__dict__['_process_switches']
+    __lt__ = Ordered.__dict__['__lt__']
+    __gt__ = Ordered.__dict__['__gt__']
+    __le__ = Ordered.__dict__['__le__']
+    __ge__ = Ordered.__dict__['__ge__']
+    get_next_node = Ordered.__dict__['get_next_node']
+    get_prev_node = Ordered.__dict__['get_prev_node']
+    is_first_node = Ordered.__dict__['is_first_node']
+    is_last_node = Ordered.__dict__['is_last_node']
+    is_right_child = Ordered.__dict__['is_right_child']
@@ -6,9 +6,15 @@
 from __future__ import unicode_literals
 from builtins import str
 from builtins import object
-from copy import copy
+from builtins import int
 from pytreex.core.exception import RuntimeException
+from pytreex.core.journal import Journal, MISSING
+from pytreex.core.columnar import ColumnarTree, NodeView
+from pytreex.core.table import TableExport
+from pytreex.core.util import SuspendedGC, StringTable
 import pytreex.core.node
+import pytreex.core.features
+import re
 
 
 __author__ = "Ondřej Dušek"
@@ -19,54 +25,309 @@ class Document(object):
     """\
     This represents a Treex document, i.e. a sequence of bundles.
     It contains an index of node IDs.
+
+    Nodes loaded from data keep their string IDs; IDs generated for new
+    nodes are integers, which are rendered as strings only when required
+    (see Node.ref_id). Both forms may be used to look up the nodes.
     """
 
-    def __init__(self, filename=None, data=None):
+    # edit journal, if changes are being recorded (see start_journal)
+    journal = None
+    # the bundle order and node number in a rendered generated ID
+    RENDERED_ID_NUMBER = re.compile(r'-s(-?[0-9]+)-n([0-9]+)$')
+
+    def __init__(self, filename=None, data=None, projection=None, columnar=None):
         """\
         Constructor. The data should contain a list of bundles that will be
-        passed to the constructor of Bundle.
+        passed to the constructor of Bundle. If projection (a set of
+        (language, selector, layer) triples) is given, only the listed zones
+        and trees are loaded from the data. Trees on the layers listed in
+        columnar are loaded as read-only columnar trees (see ColumnarTree).
         """
         data = data or []
         self.__index = {}
-        self.__backref = {}
+        # references: source -> type -> targets, target -> type -> sources
+        self.__refs_from = {}
+        self.__refs_to = {}
+        # attribute indexes: (layer, attribute) -> value -> node id -> node
+        self.attr_indexes = {}
+        self.indexed_attrs = set()
+        # whether the nodes track their attribute changes (see __update_tracking)
+        self.__tracking = False
         self.filename = filename
-        self.bundles = [Bundle(self, data=bundle_data, b_ord=b_ord)
-                        for b_ord, bundle_data in enumerate(data, start=1)]
+        self.projection = projection
+        self.columnar = frozenset(columnar or [])
+        self.__projected_zones = None
+        if projection is not None:
+            self.__projected_zones = set((language, selector)
+                                         for language, selector, _ in projection)
+        # no garbage collection while building the (cyclic) node structure
+        with SuspendedGC():
+            self.bundles = [Bundle(self, data=bundle_data, b_ord=b_ord)
+                            for b_ord, bundle_data in enumerate(data, start=1)]
+
+    def __getstate__(self):
+        """\
+        Return the document flattened for pickling: the trees packed into
+        columns, with the strings stored once in a table (see
+        Node._pack_tree). The edit journal is not kept, attribute indexes
+        are rebuilt on unpickling.
+        """
+        strings = StringTable()
+        bundles = [bundle._pack(strings) for bundle in self.bundles]
+        return {'filename': self.filename, 'projection': self.projection,
+                'columnar': self.columnar, 'attr_indexes': list(self.attr_indexes),
+                'strings': strings.strings, 'bundles': bundles}
+
+    def __setstate__(self, state):
+        "Rebuild the document from a state given by __getstate__."
+        self.__init__(state['filename'], None, state['projection'], state['columnar'])
+        strings = StringTable(state['strings'])
+        with SuspendedGC():
+            self.bundles = [Bundle._unpack(self, bundle_state, strings)
+                            for bundle_state in state['bundles']]
+        for layer, attr in state['attr_indexes']:
+            self.add_attr_index(layer, attr)
+
+    def is_projected(self, language, selector, layer=None):
+        """\
+        Return True if the given zone (or its tree on the given layer)
+        should be loaded from data, according to the document's projection.
+        """
+        if self.projection is None:
+            return True
+        if layer is None:
+            return (language, selector) in self.__projected_zones
+        return (language, selector, layer) in self.projection
+
+    def start_journal(self):
+        """\
+        Start recording all edits of the nodes in this document (attribute
+        changes, moving, creating and removing nodes), so that they can be
+        rolled back. Return a savepoint for the current state.
+
+        Changes made by modifying attribute values in place (e.g.
+        node.wild['x'] = 1 instead of node.set_attr('wild/x', 1)), adding
+        attributes that a node did not have before, and creating bundles
+        and zones are not recorded.
+        """
+        if self.journal is None:
+            self.journal = Journal()
+            self.__update_tracking()
+        return self.journal.savepoint()
+
+    def savepoint(self):
+        "Return a savepoint for the current state of the document."
+        if self.journal is None:
+            raise RuntimeException('No journal: call start_journal() first.')
+        return self.journal.savepoint()
+
+    def rollback(self, savepoint=0):
+        """\
+        Revert all edits made after the given savepoint (or since the start
+        of the journal).
+        """
+        if self.journal is None:
+            raise RuntimeException('No journal: call start_journal() first.')
+        self.journal.rollback(savepoint)
+        # the structure was restored directly, drop any indexes built since
+        for bundle in self.bundles:
+            for zone in bundle.get_all_zones():
+                for layer in ('t', 'a', 'n', 'p', 'amr'):
+                    if zone.has_tree(layer):
+                        zone.get_tree(layer)._invalidate_tree_indexes()
+
+    def stop_journal(self):
+        "Stop recording edits, keeping the document in its current state."
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+            self.__update_tracking()
+
+    def __update_tracking(self):
+        """\
+        Switch tracking of attribute changes of all nodes in this document on
+        or off, as needed by the journal or the attribute indexes. Only the
+        nodes of this document are switched (see Node._set_tracked), new
+        nodes are switched when indexed.
+        """
+        tracking = self.journal is not None or bool(self.attr_indexes)
+        if tracking == self.__tracking:
+            return
+        self.__tracking = tracking
+        for node in self.__index.values():
+            if not isinstance(node, NodeView):
+                node._set_tracked(tracking)
+
+    def get_ref_id(self, node_id):
+        """\
+        Return the ID under which the node with the given ID is indexed
+        (i.e. convert rendered generated IDs back to integers).
+        """
+        if isinstance(node_id, int) or node_id in self.__index:
+            return node_id
+        match = node_id and self.RENDERED_ID_NUMBER.search(node_id)
+        if match:
+            node = self.__index.get(
+                (int(match.group(1)) << pytreex.core.node.Node.ID_NUMBER_BITS) |
+                int(match.group(2)))
+            if node is not None and node.id == node_id:
+                return node.ref_id
+        return node_id
+
+    def render_id(self, node_id):
+        "Return the string form of the given node ID (for serialization)."
+        if isinstance(node_id, int):
+            return self.__index[node_id].id
+        return node_id
 
     def index_node(self, node):
         """\
         Index a node by its id. Also index the node's references in the
         backwards reference index.
         """
-        self.__index[node.id] = node
+        node_id = node.ref_id
+        if self.journal is not None:
+            self.journal.record(self.__restore_index, node_id,
+                                self.__index.get(node_id, MISSING))
+        if self.attr_indexes:
+            self.__update_attr_indexes(node_id, self.__index.get(node_id), node)
+        if self.__tracking and not isinstance(node, NodeView):
+            node._set_tracked(True)
+        self.__index[node_id] = node
         refs = node.get_referenced_ids()
         for ref_type, value in refs.items():
-            self.index_backref(ref_type, node.id, value)
+            self.index_backref(ref_type, node_id, value)
 
     def remove_node(self, node_id):
         "Remove a node from all indexes."
-        # delete from normal index
-        del self.__index[node_id]
-        # using backward references, remove all references to the node
-        for backref_type in self.__backref:
-            refs = self.__backref[backref_type].get(node_id)
-            if refs:
-                for ref in refs:
-                    referencing_node = self.get_node_by_id(ref)
-                    referencing_node.remove_reference(backref_type, node_id)
-                # remove the backward references from the index
-                del self.__backref[backref_type][node_id]
+        self.remove_nodes([node_id])
+
+    def remove_nodes(self, node_ids):
+        """\
+        Remove nodes (e.g. a whole subtree) from all indexes at once, removing
+        all references pointing to them from the remaining nodes.
+        """
+        removed = set(node_ids)
+        for node_id in removed:
+            if self.journal is not None:
+                self.journal.record(self.__restore_index, node_id,
+                                    self.__index[node_id])
+            if self.attr_indexes:
+                self.__update_attr_indexes(node_id, self.__index[node_id], None)
+            del self.__index[node_id]
+        # forget references going out of the removed nodes
+        for node_id in removed:
+            for attr_name, targets in list(self.__refs_from.get(node_id, {}).items()):
+                for target_id in list(targets):
+                    self.__drop_edge(node_id, attr_name, target_id)
+        # remove references to the removed nodes from the remaining nodes
+        for node_id in removed:
+            for attr_name, sources in list(self.__refs_to.get(node_id, {}).items()):
+                for source_id in list(sources):
+                    self.get_node_by_id(source_id).remove_reference(attr_name,
+                                                                    node_id)
+                    self.__drop_edge(source_id, attr_name, node_id)
+
+    def __restore_index(self, node_id, node):
+        "Restore a node index entry (used by the edit journal)."
+        if self.attr_indexes:
+            self.__update_attr_indexes(node_id, self.__index.get(node_id),
+                                       None if node is MISSING else node)
+        if node is MISSING:
+            self.__index.pop(node_id, None)
+        else:
+            self.__index[node_id] = node
+
+    def add_attr_index(self, layer, attr):
+        """\
+        Start keeping an index of the nodes on the given layer by the value
+        of the given (plain, not nested) attribute, so that find_nodes does
+        not need to look at all nodes. The index is kept up to date with all
+        changes of the attribute and all new and removed nodes.
+        """
+        if (layer, attr) in self.attr_indexes:
+            return
+        node_class = getattr(pytreex.core.node, layer.upper())
+        atype = dict(node_class.__new__(node_class).get_attr_list(include_types=True)).get(attr)
+        if atype is None or atype in (dict, list) or \
+                isinstance(atype, pytreex.core.features.FeatureBundleMeta):
+            raise RuntimeException('Cannot index attribute %s of %s-nodes' % (attr, layer))
+        index = self.attr_indexes[(layer, attr)] = {}
+        self.indexed_attrs.add(attr)
+        self.__update_tracking()
+        for node_id, node in self.__index.items():
+            if self.__get_layer(node) == layer:
+                index.setdefault(getattr(node, attr), {})[node_id] = node
+
+    def remove_attr_index(self, layer, attr):
+        "Stop keeping the given attribute index (see add_attr_index)."
+        if self.attr_indexes.pop((layer, attr), None) is None:
+            return
+        self.indexed_attrs = set(attr for _, attr in self.attr_indexes)
+        self.__update_tracking()
+
+    def find_nodes(self, layer, attr, value, zone=None):
+        """\
+        Return all nodes on the given layer (in the given zone or in the whole
+        document) that have the given value of the given attribute, in no
+        particular order. This is a lookup if the attribute is indexed (see
+        add_attr_index), otherwise all nodes are searched.
+        """
+        index = self.attr_indexes.get((layer, attr))
+        if index is not None:
+            nodes = list(index.get(value, {}).values())
+        else:
+            nodes = [node for node in self.__index.values()
+                     if self.__get_layer(node) == layer and getattr(node, attr) == value]
+        if zone is not None:
+            nodes = [node for node in nodes if node.zone is zone]
+        return nodes
+
+    def reindex_attr(self, node, attr, old_value):
+        "Update the attribute indexes after the given attribute of the node changed."
+        index = self.attr_indexes.get((self.__get_layer(node), attr))
+        if index is None:
+            return
+        node_id = node.ref_id
+        nodes = index.get(old_value)
+        if nodes is not None:
+            nodes.pop(node_id, None)
+            if not nodes:
+                del index[old_value]
+        index.setdefault(getattr(node, attr), {})[node_id] = node
+
+    def __update_attr_indexes(self, node_id, old_node, new_node):
+        "Replace a node under the given ID in all attribute indexes."
+        for (layer, attr), index in self.attr_indexes.items():
+            if old_node is not None and self.__get_layer(old_node) == layer:
+                value = getattr(old_node, attr)
+                nodes = index.get(value)
+                if nodes is not None and nodes.get(node_id) is old_node:
+                    del nodes[node_id]
+                    if not nodes:
+                        del index[value]
+            if new_node is not None and self.__get_layer(new_node) == layer:
+                index.setdefault(getattr(new_node, attr), {})[node_id] = new_node
+
+    @staticmethod
+    def __get_layer(node):
+        "Return the layer of the given node (or node view)."
+        return getattr(type(node), 'node_class', type(node)).__name__.lower()
 
     def get_node_by_id(self, node_id):
-        return self.__index[node_id]
+        node = self.__index.get(node_id)
+        if node is None:
+            return self.__index[self.get_ref_id(node_id)]
+        return node
 
     def __getitem__(self, key):
         return self.get_node_by_id(key)
 
     def __setitem__(self, key, value):
-        if value.id != key:
+        if value.id != key and value.ref_id != key:
             raise ValueError
-        return self.index_node(self, value)
+        return self.index_node(value)
 
     def __delitem__(self, key):
         self.remove_node(key)
@@ -76,44 +337,76 @@ class Document(object):
         Keep track of a backward reference (source, target node IDs are in the
         direction of the original reference)
         """
-        # create the backward index if it does not exist
-        if not self.__backref.get(attr_name):
-            self.__backref[attr_name] = {}
         # work always with lists of IDs, but handle also single IDs by
         # putting them into a list
         if not isinstance(target_ids, (list, tuple)):
             target_ids = [target_ids]
-        # save the backward references (note the direction target -> source)
+        # save the references in both directions (ordered dicts are used
+        # as sets to keep the results deterministic)
         for target_id in target_ids:
-            if not self.__backref[attr_name].get(target_id):
-                self.__backref[attr_name][target_id] = []
-            self.__backref[attr_name][target_id].append(source_id)
+            if target_id is not None:
+                self.__add_edge(source_id, attr_name, self.get_ref_id(target_id))
 
     def remove_backref(self, attr_name, source_id, target_ids):
         """\
         Remove references from the backwards index.
         """
-        # return if the index does not exist at all
-        if not self.__backref.get(attr_name):
-            return
         # work always with lists of IDs, but handle also single IDs
         # by putting them into a list
         if not isinstance(target_ids, (list, tuple)):
             target_ids = [target_ids]
-        # delete all references
+        # delete all references (ignore those that are not there)
         for target_id in target_ids:
-            try:
-                self.__backref[attr_name][target_id].remove(source_id)
-            except:  # if the reference is not there, we don't care
-                pass
+            if target_id is not None:
+                self.__drop_edge(source_id, attr_name, self.get_ref_id(target_id))
+
+    def __add_edge(self, source_id, attr_name, target_id):
+        "Add a reference to both directions of the index."
+        targets = self.__refs_from.setdefault(source_id, {}).setdefault(attr_name, {})
+        if target_id in targets:
+            return
+        targets[target_id] = None
+        self.__refs_to.setdefault(target_id, {}).setdefault(
+            attr_name, {})[source_id] = None
+        if self.journal is not None:
+            self.journal.record(self.__drop_edge, source_id, attr_name, target_id)
+
+    def __drop_edge(self, source_id, attr_name, target_id):
+        "Remove a reference from both directions of the index, if present."
+        if target_id not in self.__refs_from.get(source_id, {}).get(attr_name, ()):
+            return
+        self.__remove_edge(self.__refs_from, source_id, attr_name, target_id)
+        self.__remove_edge(self.__refs_to, target_id, attr_name, source_id)
+        if self.journal is not None:
+            self.journal.record(self.__add_edge, source_id, attr_name, target_id)
+
+    @staticmethod
+    def __remove_edge(refs, node_id, attr_name, other_id):
+        "Remove a reference from one direction of the index, if present."
+        node_refs = refs.get(node_id)
+        if not node_refs or attr_name not in node_refs:
+            return
+        node_refs[attr_name].pop(other_id, None)
+        if not node_refs[attr_name]:
+            del node_refs[attr_name]
+            if not node_refs:
+                del refs[node_id]
 
     def get_backref(self, attr_name, target_id):
         """Return IDs of nodes referencing the given node through the given attribute."""
-        if attr_name not in self.__backref:
-            return []
-        if target_id not in self.__backref[attr_name]:
-            return []
-        return copy(self.__backref[attr_name][target_id])
+        target_id = self.get_ref_id(target_id)
+        return list(self.__refs_to.get(target_id, {}).get(attr_name, ()))
+
+    def to_table(self, language, selector, layer, attrs, export=None):
+        """\
+        Return a table (a dict of NumPy arrays) of the given attributes of all
+        nodes of the given zone's trees on the given layer, in all bundles (see
+        TableExport). An export may be given to share value codes with other
+        tables and to look up the values of the codes.
+        """
+        export = export or TableExport(layer, attrs)
+        export.add_document(self, language, selector)
+        return export.get_table()
 
     def create_bundle(self, data=None):
         """\
@@ -122,6 +415,38 @@ class Document(object):
         self.bundles.append(Bundle(self, data, b_ord=len(self.bundles) + 1))
         return self.bundles[-1]
 
+    def close(self):
+        """\
+        Tear the document down, breaking all reference cycles among its
+        bundles, zones, trees and nodes, so that they are freed at once by
+        reference counting, without waiting for the garbage collector (or
+        even if they were frozen, see SuspendedGC). The document is empty
+        afterwards and its former nodes must not be used any more.
+        """
+        self.stop_journal()
+        for layer, attr in list(self.attr_indexes):
+            self.remove_attr_index(layer, attr)
+        objects = [node for node in self.__index.values()
+                   if not isinstance(node, NodeView)]
+        for bundle in self.bundles:
+            for zone in bundle.get_all_zones():
+                for layer in ('t', 'a', 'n', 'p', 'amr'):
+                    if not zone.has_tree(layer):
+                        continue
+                    root = zone.get_tree(layer)
+                    if isinstance(root, NodeView):
+                        objects.append(root.tree)
+                    else:
+                        objects.extend(root.get_descendants(add_self=True))
+                objects.append(zone)
+            objects.append(bundle)
+        for obj in objects:
+            obj.__dict__.clear()
+        self.__index = {}
+        self.__refs_from = {}
+        self.__refs_to = {}
+        self.bundles = []
+
 
 class Bundle(object):
     """\
@@ -138,12 +463,59 @@ class Bundle(object):
         self.__document = document
         # if no order is given, default to -1
         self.__ord = b_ord is not None and b_ord or -1
+        self.__last_node_number = 0
         self.__zones = {}
         # sort zones according to language and selector
         for zone_data in data:
+            if (document is not None and
+                    not document.is_projected(zone_data.get('language'),
+                                              zone_data.get('selector') or '')):
+                continue
             zone = Zone(data=zone_data, bundle=self)
             self.__zones[(zone.language, zone.selector)] = zone
         self.wild = {}
+        if data:
+            self.__skip_loaded_ids()
+
+    def __skip_loaded_ids(self):
+        """\
+        Make the node numbers generated in this bundle continue after the
+        highest number in the (rendered generated) IDs of the loaded nodes,
+        so that new nodes never get the ID of a loaded one.
+        """
+        last = self.__last_node_number
+        for zone in self.__zones.values():
+            for layer in ('t', 'a', 'n', 'p', 'amr'):
+                if not zone.has_tree(layer):
+                    continue
+                root = zone.get_tree(layer)
+                if isinstance(root, NodeView):
+                    node_ids = root.tree.ids
+                else:
+                    node_ids = [node.id for node in root.get_descendants(add_self=True)]
+                for node_id in node_ids:
+                    match = (not isinstance(node_id, int) and
+                             Document.RENDERED_ID_NUMBER.search(node_id))
+                    if match and int(match.group(2)) > last:
+                        last = int(match.group(2))
+        self.__last_node_number = last
+
+    def _pack(self, strings):
+        "Return the bundle flattened for pickling (see Document.__getstate__)."
+        return (self.__ord, self.__last_node_number, self.wild,
+                [zone._pack(strings) for zone in self.get_all_zones()])
+
+    @classmethod
+    def _unpack(cls, document, state, strings):
+        "Rebuild a bundle packed by _pack in the given document."
+        b_ord, last_node_number, wild, zones = state
+        bundle = cls(document, b_ord=b_ord)
+        bundle.__last_node_number = last_node_number
+        bundle.wild = wild
+        for zone_state in zones:
+            zone = Zone._unpack(bundle, zone_state, strings)
+            bundle.__zones[(zone.language, zone.selector)] = zone
+        return bundle
 
     def get_all_zones(self):
         """\
@@ -189,6 +561,17 @@ class Bundle(object):
         "The document this bundle belongs to."
         return self.__document
 
+    def generate_node_id(self):
+        """\
+        Return a new (integer) ID for a node in this bundle. The ID combines
+        the bundle order with a count of the nodes created in this bundle,
+        so it does not depend on any other bundles (which may be processed
+        elsewhere in a parallel run).
+        """
+        self.__last_node_number += 1
+        return ((self.__ord << pytreex.core.node.Node.ID_NUMBER_BITS) |
+                self.__last_node_number)
+
     @property
     def ord(self):
         "The order of this bundle in the document, as given by constructor"
@@ -215,12 +598,47 @@ class Zone(object):
         for layer in ('t', 'a', 'n', 'p', 'amr'):
             if layer + 'tree' in data:
                 # hacking around Treex TAMR (storing AMRs in a t-layer under a different selector)
-                self.create_tree('amr'
-                                 if self.selector.startswith('amr') and layer == 't'
-                                 else layer,
-                                 data[layer + 'tree'])
+                tree_layer = ('amr' if self.selector.startswith('amr') and layer == 't'
+                              else layer)
+                # skip trees not required by the document's projection
+                if (self.document is not None and
+                        not self.document.is_projected(self.language, self.selector,
+                                                       tree_layer)):
+                    continue
+                if self.document is not None and tree_layer in self.document.columnar:
+                    self.create_columnar_tree(tree_layer, data[layer + 'tree'])
+                else:
+                    self.create_tree(tree_layer, data[layer + 'tree'])
         self.wild = {}
 
+    def _pack(self, strings):
+        "Return the zone flattened for pickling (see Document.__getstate__)."
+        trees = []
+        for layer in ('t', 'a', 'n', 'p', 'amr'):
+            if self.has_tree(layer):
+                root = self.get_tree(layer)
+                if isinstance(root, NodeView):
+                    trees.append((layer, True, root.tree._pack(strings)))
+                else:
+                    trees.append((layer, False, root._pack_tree(strings)))
+        return self.language, self.selector, self.sentence, self.wild, trees
+
+    @classmethod
+    def _unpack(cls, bundle, state, strings):
+        "Rebuild a zone packed by _pack in the given bundle."
+        language, selector, sentence, wild, trees = state
+        zone = cls(language=language, selector=selector, bundle=bundle)
+        zone.sentence = sentence
+        zone.wild = wild
+        for layer, columnar, tree_state in trees:
+            if columnar:
+                root = ColumnarTree._unpack(tree_state, zone, strings).root
+            else:
+                node_type = getattr(pytreex.core.node, layer.upper())
+                root = node_type._unpack_tree(tree_state, zone, strings)
+            setattr(zone, layer + 'tree', root)
+        return zone
+
     @property
     def bundle(self):
         "The bundle in which this zone is located"
@@ -277,6 +695,49 @@ class Zone(object):
                 node.parent = doc.get_node_by_id(parent_id)
         return self.get_tree(layer)
 
+    def to_table(self, layer, attrs, export=None):
+        """\
+        Return a table (a dict of NumPy arrays) of the given attributes of all
+        nodes of the tree on the given layer (see TableExport and
+        Document.to_table).
+        """
+        export = export or TableExport(layer, attrs)
+        export.add_tree(self.get_tree(layer))
+        return export.get_table()
+
+    def create_columnar_tree(self, layer, data):
+        """\
+        Create a read-only columnar tree on the given layer from the given
+        data (see ColumnarTree), return the view of its root.
+        """
+        root = ColumnarTree.from_data(layer, data, zone=self).root
+        setattr(self, layer + 'tree', root)
+        return root
+
+    def to_columnar(self, layer):
+        """\
+        Replace the tree on the given layer by a read-only columnar tree with
+        the same nodes (see ColumnarTree), return the view of its root.
+        """
+        root = self.get_tree(layer)
+        if isinstance(root, NodeView):
+            return root
+        root = ColumnarTree.from_tree(root, zone=self).root
+        delattr(self, '_Zone__' + layer + 'tree')
+        setattr(self, layer + 'tree', root)
+        return root
+
+    def from_columnar(self, layer):
+        """\
+        Replace the columnar tree on the given layer by ordinary nodes with the
+        same IDs and attributes, return the new root.
+        """
+        root = self.get_tree(layer)
+        if not isinstance(root, NodeView):
+            return root
+        delattr(self, '_Zone__' + layer + 'tree')
+        return self.create_tree(layer, root.tree.to_data())
+
     def has_ttree(self):
         "Return true if this zone has a t-tree."
         return hasattr(self, 'ttree')
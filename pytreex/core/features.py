@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Compact bundles of categorical features (morphcat, grammatemes, Interset)
+#
+from __future__ import unicode_literals
+from builtins import str, object
+from future.utils import with_metaclass
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:  # Python 2
+    from collections import Mapping, MutableMapping
+import copy
+import threading
+
+
+class FeatureBundleMeta(type(MutableMapping)):
+    "Sets up the value codes for each class of feature bundles."
+
+    def __init__(cls, name, bases, namespace):
+        super(FeatureBundleMeta, cls).__init__(name, bases, namespace)
+        # bit shift of each category in the packed integer
+        cls._shifts = dict((category, slot * cls.SLOT_BITS)
+                           for slot, category in enumerate(cls.categories))
+        # code -> value (code 0 means "not set") and value -> code, per slot
+        cls._values = [[None] for _ in cls.categories]
+        cls._codes = [{} for _ in cls.categories]
+
+
+class FeatureBundle(with_metaclass(FeatureBundleMeta, MutableMapping)):
+    """\
+    A dict-like bundle of categorical features with a fixed set of categories
+    (given by derived classes).
+
+    The whole bundle is a single integer, with one byte (slot) per category
+    holding the code of its value (0 if not set). The codes are shared by
+    all bundles of the same class, so the bundles are small and copying,
+    comparing and matching whole bundles only takes a few integer operations.
+    Keys that are not categories of the bundle and values that are not coded
+    (other than strings, more than 255 values of one category) are kept in
+    an ordinary dict.
+    """
+
+    __slots__ = ['packed', 'extra']
+
+    # the categories (to be overridden by derived classes)
+    categories = []
+
+    SLOT_BITS = 8
+    SLOT_MASK = (1 << SLOT_BITS) - 1
+
+    # guards adding new value codes (bundles may be used in parallel threads)
+    _lock = threading.Lock()
+
+    def __init__(self, values=None):
+        self.packed = 0
+        self.extra = None
+        if isinstance(values, dict):
+            # fast path for plain dicts (as loaded from files)
+            shifts, codes = self._shifts, self._codes
+            packed = 0
+            for key, value in values.items():
+                shift = shifts.get(key)
+                code = 0
+                if shift is not None:
+                    slot = shift // FeatureBundle.SLOT_BITS
+                    code = ((isinstance(value, str) and codes[slot].get(value)) or
+                            self._get_code(slot, value))
+                if code:
+                    packed |= code << shift
+                else:
+                    if self.extra is None:
+                        self.extra = {}
+                    self.extra[key] = value
+            self.packed = packed
+        elif values:
+            self.update(values)
+
+    @classmethod
+    def _get_code(cls, slot, value):
+        "Return the code of the value in the given slot, 0 if it cannot be coded."
+        if not isinstance(value, str) and value is not None:
+            return 0
+        codes = cls._codes[slot]
+        code = codes.get(value)
+        if code is None:
+            with FeatureBundle._lock:
+                code = codes.get(value)
+                if code is None:
+                    values = cls._values[slot]
+                    if len(values) > FeatureBundle.SLOT_MASK:
+                        return 0
+                    code = codes[value] = len(values)
+                    values.append(value)
+        return code
+
+    def __getitem__(self, key):
+        shift = self._shifts.get(key)
+        if shift is not None:
+            code = (self.packed >> shift) & FeatureBundle.SLOT_MASK
+            if code:
+                return self._values[shift // FeatureBundle.SLOT_BITS][code]
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        shift = self._shifts.get(key)
+        if shift is not None:
+            code = (self.packed >> shift) & FeatureBundle.SLOT_MASK
+            if code:
+                return self._values[shift // FeatureBundle.SLOT_BITS][code]
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def __contains__(self, key):
+        shift = self._shifts.get(key)
+        if shift is not None and (self.packed >> shift) & FeatureBundle.SLOT_MASK:
+            return True
+        return self.extra is not None and key in self.extra
+
+    def __setitem__(self, key, value):
+        shift = self._shifts.get(key)
+        if shift is not None:
+            self.packed &= ~(FeatureBundle.SLOT_MASK << shift)
+            code = self._get_code(shift // FeatureBundle.SLOT_BITS, value)
+            if code:
+                self.packed |= code << shift
+                if self.extra is not None:
+                    self.extra.pop(key, None)
+                return
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def __delitem__(self, key):
+        shift = self._shifts.get(key)
+        if shift is not None and (self.packed >> shift) & FeatureBundle.SLOT_MASK:
+            self.packed &= ~(FeatureBundle.SLOT_MASK << shift)
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        packed = self.packed
+        for category in self.categories:
+            if not packed:
+                break
+            if packed & FeatureBundle.SLOT_MASK:
+                yield category
+            packed >>= FeatureBundle.SLOT_BITS
+        if self.extra:
+            for key in list(self.extra):
+                yield key
+
+    def __len__(self):
+        count = len(self.extra) if self.extra else 0
+        packed = self.packed
+        while packed:
+            if packed & FeatureBundle.SLOT_MASK:
+                count += 1
+            packed >>= FeatureBundle.SLOT_BITS
+        return count
+
+    def copy(self):
+        "Return a copy of the bundle."
+        bundle = self.__class__.__new__(self.__class__)
+        bundle.packed = self.packed
+        bundle.extra = copy.deepcopy(self.extra) if self.extra else None
+        return bundle
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __reduce__(self):
+        # the value codes are not the same in other processes
+        return (self.__class__, (self.to_dict(),))
+
+    def update(self, other=(), **kwargs):
+        "Update from another bundle of the same class (fast) or any mapping."
+        if type(other) is not type(self):
+            return MutableMapping.update(self, other, **kwargs)
+        mask = other.get_mask()
+        self.packed = (self.packed & ~mask) | other.packed
+        if self.extra and mask:
+            for key in other:
+                self.extra.pop(key, None)
+        if other.extra:
+            if self.extra is None:
+                self.extra = {}
+            self.extra.update(other.extra)
+        if kwargs:
+            MutableMapping.update(self, **kwargs)
+
+    def get_mask(self):
+        "Return a mask of all the slots that are set in this bundle."
+        mask = 0
+        packed = self.packed
+        shift = 0
+        while packed:
+            if packed & FeatureBundle.SLOT_MASK:
+                mask |= FeatureBundle.SLOT_MASK << shift
+            packed >>= FeatureBundle.SLOT_BITS
+            shift += FeatureBundle.SLOT_BITS
+        return mask
+
+    def matches(self, pattern):
+        """\
+        Return True if this bundle has the same values for all features set
+        in the pattern (a bundle of the same class or any mapping).
+        """
+        if type(pattern) is not type(self):
+            pattern = self.__class__(pattern)
+        if (self.packed ^ pattern.packed) & pattern.get_mask():
+            return False
+        if pattern.extra:
+            return all(key in self and self[key] == value
+                       for key, value in pattern.extra.items())
+        return True
+
+    def to_dict(self):
+        "Return the features as a plain dict."
+        features = {}
+        packed = self.packed
+        for category, values in zip(self.categories, self._values):
+            if not packed:
+                break
+            code = packed & FeatureBundle.SLOT_MASK
+            if code:
+                features[category] = values[code]
+            packed >>= FeatureBundle.SLOT_BITS
+        if self.extra:
+            features.update(self.extra)
+        return features
+
+    @classmethod
+    def pack_column(cls, bundles):
+        """\
+        Return a list of bundles of this class (or None) flattened for
+        pickling: their packed integers, the values of the codes (which are
+        not the same in other processes) and any extra features, by position.
+        """
+        extras = dict((index, bundle.extra) for index, bundle in enumerate(bundles)
+                      if bundle is not None and bundle.extra)
+        return ([None if bundle is None else bundle.packed for bundle in bundles],
+                [list(values) for values in cls._values], extras)
+
+    @classmethod
+    def unpack_column(cls, state):
+        "Rebuild a list of bundles packed by pack_column, recoding the values."
+        packed_list, values, extras = state
+        # the code of each of the given codes in this process, by slot
+        recode = [[cls._get_code(slot, value) if code else 0
+                   for code, value in enumerate(slot_values)]
+                  for slot, slot_values in enumerate(values)]
+        same = all(codes == list(range(len(codes))) for codes in recode)
+        bundles = []
+        for packed in packed_list:
+            if packed is None:
+                bundles.append(None)
+                continue
+            bundle = cls.__new__(cls)
+            bundle.extra = None
+            if not same:
+                old, packed, shift = packed, 0, 0
+                for slot, codes in enumerate(recode):
+                    if not old:
+                        break
+                    code = old & FeatureBundle.SLOT_MASK
+                    if codes[code]:
+                        packed |= codes[code] << shift
+                    elif code:  # no code left for the value here
+                        bundle.extra = bundle.extra or {}
+                        bundle.extra[cls.categories[slot]] = values[slot][code]
+                    old >>= FeatureBundle.SLOT_BITS
+                    shift += FeatureBundle.SLOT_BITS
+            bundle.packed = packed
+            bundles.append(bundle)
+        for index, extra in extras.items():
+            extra = dict(extra)
+            extra.update(bundles[index].extra or {})
+            bundles[index].extra = extra
+        return bundles
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return self.packed == other.packed and (
+                self.extra == other.extra or not (self.extra or other.extra))
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.to_dict())
+
+
+class FeatureAttr(object):
+    """\
+    Descriptor for node attributes holding feature bundles. The value is
+    kept in the node's dictionary under the attribute's own name; dicts
+    (and other mappings) are converted to bundles of the given class.
+    """
+
+    def __init__(self, name, bundle_class):
+        self.name = name
+        self.bundle_class = bundle_class
+
+    def __get__(self, node, owner):
+        if node is None:
+            return self
+        try:
+            return node.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, node, value):
+        if value is not None and not isinstance(value, self.bundle_class):
+            value = self.bundle_class(value)
+        node.__dict__[self.name] = value
+
+
+class Morphcat(FeatureBundle):
+    "Morphological categories of an a-node (A.morphcat)."
+
+    __slots__ = []
+    categories = ['pos', 'subpos', 'gender', 'number', 'case', 'person',
+                  'tense', 'negation', 'voice', 'grade', 'mood',
+                  'possnumber', 'possgender']
+
+
+class Grammatemes(FeatureBundle):
+    "Grammatemes of a t-node (T.gram)."
+
+    __slots__ = []
+    categories = ['sempos', 'gender', 'number', 'numertype', 'indeftype',
+                  'person', 'politeness', 'negation', 'definiteness',
+                  'degcmp', 'verbmod', 'deontmod', 'factmod', 'dispmod',
+                  'tense', 'aspect', 'resultative', 'iterativeness',
+                  'diathesis', 'typgroup']
+
+
+class Interset(FeatureBundle):
+    "Interset features of an a-node (A.iset)."
+
+    __slots__ = []
+    categories = ['pos', 'nountype', 'nametype', 'morphpos', 'adjtype',
+                  'prontype', 'numtype', 'numform', 'numvalue', 'accommodability',
+                  'verbtype', 'advtype', 'adpostype', 'conjtype', 'parttype',
+                  'punctype', 'puncside', 'synpos', 'poss', 'reflex',
+                  'negativeness', 'definiteness', 'foreign', 'abbr', 'hyph',
+                  'typo', 'echo', 'gender', 'possgender', 'animateness',
+                  'number', 'possnumber', 'possednumber', 'case', 'prepcase',
+                  'degree', 'person', 'possperson', 'politeness', 'verbform',
+                  'mood', 'tense', 'voice', 'aspect', 'subcat', 'variant',
+                  'style', 'position', 'other', 'tagset']
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Edit journal for undoing changes in Treex documents
+#
+from __future__ import unicode_literals
+from builtins import object
+from pytreex.core.exception import RuntimeException
+
+
+# marks attributes that did not exist before being set
+MISSING = object()
+
+
+class Journal(object):
+    """\
+    An undo log of the edits of a document (see Document.start_journal).
+
+    Each entry holds a function and its arguments that revert one change.
+    Rolling back to a savepoint calls the functions of all entries recorded
+    since the savepoint, in reverse order, so it costs as much as the edits
+    made, not as much as the document size.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.replaying = False
+        self.closed = False
+
+    def record(self, undo, *args):
+        "Record a function (with arguments) that reverts a change."
+        if not self.replaying:
+            self.entries.append((undo, args))
+
+    def savepoint(self):
+        "Return a savepoint which can be rolled back to later."
+        return len(self.entries)
+
+    def rollback(self, savepoint=0):
+        "Revert all changes recorded after the given savepoint."
+        if savepoint > len(self.entries):
+            raise RuntimeException('Savepoint has already been rolled back.')
+        entries = self.entries
+        self.replaying = True
+        try:
+            while len(entries) > savepoint:
+                undo, args = entries.pop()
+                undo(*args)
+        finally:
+            self.replaying = False
+
+    def close(self):
+        "Stop recording changes, forget all entries."
+        if self.closed:
+            return
+        self.closed = True
+        self.entries = []
@@ -19,16 +19,19 @@ handler.setFormatter(logging.Formatter(LOGFORMAT))
 logger.addHandler(handler)
 
 
+# (the logger and its handler are thread-safe; calling it directly avoids
+# the global lock taken by logging.getLogger on every message)
+
 def log_info(message):
     "Print an information message"
-    logging.getLogger(LOG_NAME).info('PYTREEX-INFO: ' + message)
+    logger.info('PYTREEX-INFO: ' + message)
 
 
 def log_warn(message):
     "Print a warning message"
-    logging.getLogger(LOG_NAME).warn('PYTREEX-WARN: ' + message)
+    logger.warning('PYTREEX-WARN: ' + message)
 
 def log_fatal(message, exc=Exception()):
     "Print a fatal error message, then raise exception"
-    logging.getLogger(LOG_NAME).warn('PYTREEX-FATAL: ' + message)
+    logger.warning('PYTREEX-FATAL: ' + message)
     raise exc
@@ -5,20 +5,30 @@
 #
 
 from __future__ import unicode_literals
-from future.utils import python_2_unicode_compatible
+from future.utils import python_2_unicode_compatible, native_str
 from builtins import zip
 from builtins import next
 from builtins import str
+from builtins import int
 from builtins import object
 from pytreex.core.exception import RuntimeException
 from pytreex.core.log import log_warn
 from collections import deque
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from operator import itemgetter
 import types
 import re
 import sys
 import inspect
+import threading
 import unidecode
-from pytreex.core.util import as_list
+from array import array
+from pytreex.core.util import as_list, SymbolTable
+from pytreex.core.journal import MISSING
+from pytreex.core.features import FeatureBundle, FeatureBundleMeta, \
+    FeatureAttr, Morphcat, Grammatemes, Interset
+import copy
 
 
 __author__ = "Ondřej Dušek"
@@ -30,12 +40,30 @@ class Node(object):
     "Representing a node in a tree (recursively)"
 
     __lastId = 0
+    # node class -> its subclass tracking attribute changes (see _set_tracked)
+    __tracked_classes = {}
+    # guards the global ID counter and the per-class attribute list caches
+    # (documents may be processed in parallel threads)
+    __lock = threading.Lock()
+    # generated IDs hold the bundle order in the upper bits and the number
+    # of the node within the bundle in the lower bits (see ref_id)
+    ID_NUMBER_BITS = 32
     # this holds attributes used for all nodes
     # (overridden in derived classes and used from get_attr_list)
     attrib = [('alignment', list), ('wild', dict)]
     # this similarly holds a list of attributes that contain references
     # (to be overridden by derived classes)
     ref_attrib = []
+    # attributes with values from a small vocabulary (for dicts: all their
+    # values), which are interned in the symbol table below
+    # (to be overridden by derived classes)
+    categorical_attrib = []
+    # shared instances of categorical attribute values (for all documents)
+    symbols = SymbolTable()
+    # edits of the tree are being batched (set on roots, see batch_edits)
+    _edit_batch = None
+    # names of indexes cached on tree roots, dropped on structural changes
+    tree_indexes = ['_eff_index', '_clause_index']
 
     def __init__(self, data=None, parent=None, zone=None):
         "Constructor, can create a tree recursively"
@@ -45,16 +73,23 @@ class Node(object):
         self.__zone = zone or (parent and parent.zone) or None
         self.__document = self.zone and self.zone.document or None
         self.__parent = None
+        self.__children = []
         self.parent = parent
         # set all attributes belonging to the current node class
         # (replace '.' with '_')
+        categorical = self.get_categorical_attrs()
         for attr_type, safe_attr in zip(self.get_attr_list(include_types=True),
                                         self.get_attr_list(safe=True)):
             attr, att_type = attr_type
             # initialize lists and dicts, perform simple type coercion on other
             if att_type == dict:
-                setattr(self, safe_attr,
-                        data.get(attr) is not None and dict(data[attr]) or {})
+                val = data.get(attr) is not None and dict(data[attr]) or {}
+                if attr in categorical:
+                    Node.symbols.intern_values(val)
+                setattr(self, safe_attr, val)
+            elif type(att_type) is FeatureBundleMeta:
+                # feature bundles: coded values need no interning
+                setattr(self, safe_attr, att_type(data.get(attr)))
             elif att_type == list:
                 setattr(self, safe_attr,
                         data.get(attr) is not None and list(data[attr]) or [])
@@ -67,6 +102,8 @@ class Node(object):
                 # to false -- cannot use the and-or trick
                 if data.get(attr) is not None:
                     val = att_type(data[attr])
+                    if attr in categorical:
+                        val = Node.symbols.intern(val)
                 else:
                     val = None
                 setattr(self, safe_attr, val)
@@ -74,29 +111,45 @@ class Node(object):
         # after attributes have been set due to references)
         self.id = data.get('id') or self.__generate_id()
         # create children (will add themselves to the list automatically)
-        self.__children = []
         if ('children' in data):
             # call the right constructor for each child from data
             [self.create_child(data=child_data)
              for child_data in data['children']]
 
     def __generate_id(self):
-        "Generate successive IDs for all nodes"
-        Node.__lastId += 1
-        ret = re.sub(r'^.*\.', '', self.__class__.__name__.lower()) + '-node-'
-        if self.zone:
-            ret += self.zone.language_and_selector + '-'
-            if self.zone.bundle:
-                ret += 's' + str(self.zone.bundle.ord) + '-'
-        ret += 'n' + str(Node.__lastId)
-        return ret
+        """\
+        Generate successive IDs for all nodes: integers counted per bundle
+        (see ref_id), strings for nodes that are not in any bundle.
+        """
+        if self.__zone and self.__zone.bundle:
+            return self.__zone.bundle.generate_node_id()
+        with Node.__lock:
+            Node.__lastId += 1
+            number = Node.__lastId
+        return self.__render_id(number)
+
+    def __render_id(self, number):
+        "Render a generated integer ID of this node in the usual string form."
+        return self._render_generated_id(self.__zone, number)
+
+    @classmethod
+    def _render_generated_id(cls, zone, number):
+        "Render a generated integer ID of a node of this class in the given zone."
+        if not zone:
+            return '%s-node-n%s' % (cls.__name__.lower(), number)
+        if not zone.bundle:
+            return '%s-node-%s-n%s' % (cls.__name__.lower(),
+                                       zone.language_and_selector, number)
+        return '%s-node-%s-s%s-n%s' % (cls.__name__.lower(),
+                                       zone.language_and_selector, zone.bundle.ord,
+                                       number & ((1 << Node.ID_NUMBER_BITS) - 1))
 
     @staticmethod
     def __safe_name(attr):
         """Return a safe version of an attribute's name
         (mangle referencing attributes)."""
         if attr.endswith('.rf'):
-            return '__' + re.sub(r'\.', '_', attr)
+            return '__' + attr.replace('.', '_')
         return attr
 
     def __track_backref(self, name, value):
@@ -107,11 +160,11 @@ class Node(object):
             old_alignment = self.get_attr('alignment')
             if old_alignment:
                 for reference in old_alignment:
-                    self.document.remove_backref('alignment', self.id,
+                    self.document.remove_backref('alignment', self.__id,
                                                  reference['counterpart.rf'])
             if value:
                 for reference in value:
-                    self.document.index_backref('alignment', self.id,
+                    self.document.index_backref('alignment', self.__id,
                                                 reference['counterpart.rf'])
             return
         # test if the attribute contains references
@@ -128,19 +181,95 @@ class Node(object):
         # track all the references
         for ref_name, ref_value in zip(ref_keys, ref_values):
             old_value = self.get_attr(ref_name)
-            self.document.remove_backref(ref_name, self.id, old_value)
-            self.document.index_backref(ref_name, self.id, ref_value)
+            self.document.remove_backref(ref_name, self.__id, old_value)
+            self.document.index_backref(ref_name, self.__id, ref_value)
+
+    def _set_tracked(self, enable):
+        """\
+        Switch tracking of this node's attribute changes on or off, by
+        swapping its class for a subclass with _tracked_setattr as
+        __setattr__ (so that nodes of other documents are not slowed down).
+        """
+        node_class = getattr(type(self), '_untracked_class', type(self))
+        if enable:
+            node_class = Node._get_tracked_class(node_class)
+        if type(self) is not node_class:
+            object.__setattr__(self, '__class__', node_class)
+
+    @staticmethod
+    def _get_tracked_class(node_class):
+        "Return the subclass of the given node class that tracks attribute changes."
+        tracked_class = Node.__tracked_classes.get(node_class)
+        if tracked_class is None:
+            with Node.__lock:
+                tracked_class = Node.__tracked_classes.get(node_class)
+                if tracked_class is None:
+                    # (no attributes of its own, the same name for IDs and layers)
+                    tracked_class = type(native_str(node_class.__name__), (node_class,), {
+                        '__module__': node_class.__module__,
+                        '__setattr__': Node._tracked_setattr,
+                        '__reduce_ex__': Node._reduce_untracked,
+                        '_untracked_class': node_class,
+                        'attrib': [], 'ref_attrib': [], 'categorical_attrib': []})
+                    Node.__tracked_classes[node_class] = tracked_class
+        return tracked_class
+
+    def _reduce_untracked(self, protocol):
+        "Pickle/copy a tracking node as a node of the original class."
+        reduced = list(object.__reduce_ex__(self, protocol))
+        args = reduced[1]
+        if args and args[0] is type(self):
+            reduced[1] = (self._untracked_class,) + tuple(args[1:])
+        return tuple(reduced)
+
+    def _tracked_setattr(self, name, value):
+        """\
+        Set an attribute, recording its old value in the document's edit
+        journal and updating the document's attribute indexes (used as
+        __setattr__ of nodes whose changes are tracked, see _set_tracked).
+        """
+        document = self.__dict__.get('_Node__document')
+        if (document is None or
+                (document.journal is None and name not in document.indexed_attrs) or
+                isinstance(getattr(type(self), name, None), property)):
+            object.__setattr__(self, name, value)
+            return
+        old_value = self.__dict__.get(name, MISSING)
+        if old_value is value:  # no change, nothing to record
+            return
+        # new attributes (e.g. of new nodes) are not recorded, new nodes
+        # are rolled back by restoring their parents and the index
+        if document.journal is not None and old_value is not MISSING:
+            document.journal.record(Node._restore_attr, self, name, old_value)
+        object.__setattr__(self, name, value)
+        # (new nodes are added to attribute indexes once they get an ID)
+        if name in document.indexed_attrs and old_value is not MISSING:
+            document.reindex_attr(self, name, old_value)
+
+    @staticmethod
+    def _restore_attr(node, name, value):
+        "Restore an attribute value (used by the edit journal)."
+        old_value = node.__dict__.get(name, MISSING)
+        node.__dict__[name] = value
+        document = node.__dict__.get('_Node__document')
+        if document is not None and name in document.indexed_attrs and \
+                old_value is not MISSING:
+            document.reindex_attr(node, name, old_value)
 
     def get_attr_list(self, include_types=False, safe=False):
         """Get attributes of the current class
         (gathering all attributes of base classes)"""
         # Caching for classes
         # (since the output is always the same for the same class)
+        # (look into the class's own dict, subclasses must not share the cache)
         myclass = self.__class__
-        if not hasattr(myclass, '__attr_list_cache'):
-            myclass.__attr_list_cache = {}
+        attrs = myclass.__dict__.get('_Node__attr_list_cache', {}).get((include_types, safe))
+        if attrs is not None:
+            return attrs
         # Not in cache -- must compute
-        if not (include_types, safe) in myclass.__attr_list_cache:
+        with Node.__lock:
+            if '_Node__attr_list_cache' not in myclass.__dict__:
+                myclass.__attr_list_cache = {}
             mybases = inspect.getmro(myclass)
             attrs = [attr for cls in mybases if hasattr(cls, 'attrib') for attr in cls.attrib]
             if safe:
@@ -149,19 +278,22 @@ class Node(object):
             if not include_types:
                 attrs = [attr for attr, atype in attrs]
             myclass.__attr_list_cache[(include_types, safe)] = attrs
-        # Return the result from cache
-        return myclass.__attr_list_cache[(include_types, safe)]
+        return attrs
 
     def get_ref_attr_list(self, split_nested=False):
         """Return a list of the attributes of the current class that
         contain references (splitting nested ones, if needed)"""
         # Caching for classes
         # (since the output is always the same for the same class)
+        # (look into the class's own dict, subclasses must not share the cache)
         myclass = self.__class__
-        if not hasattr(myclass, '__ref_attr_cache'):
-            myclass.__ref_attr_cache = {}
+        attrs = myclass.__dict__.get('_Node__ref_attr_cache', {}).get(split_nested)
+        if attrs is not None:
+            return attrs
         # Not in cache -- must compute
-        if split_nested not in self.__class__.__ref_attr_cache:
+        with Node.__lock:
+            if '_Node__ref_attr_cache' not in myclass.__dict__:
+                myclass.__ref_attr_cache = {}
             mybases = inspect.getmro(myclass)
             attrs = [attr for cls in mybases if hasattr(cls, 'ref_attrib') for attr in cls.ref_attrib]
             if not split_nested:
@@ -178,9 +310,20 @@ class Node(object):
                         if not isinstance(attr_dict.get(key), dict):
                             attr_dict[key] = {}
                         attr_dict[key][val] = True
-                myclass.__ref_attr_cache[split_nested] = attr_dict
-        # Return the result from cache
-        return myclass.__ref_attr_cache[split_nested]
+                attrs = myclass.__ref_attr_cache[split_nested] = attr_dict
+        return attrs
+
+    def get_categorical_attrs(self):
+        """Return the set of categorical attributes of the current class
+        (gathering all attributes of base classes)"""
+        myclass = self.__class__
+        attrs = myclass.__dict__.get('_Node__categorical_cache')
+        if attrs is None:
+            attrs = frozenset(attr for cls in inspect.getmro(myclass)
+                              for attr in getattr(cls, 'categorical_attrib', []))
+            # (computing twice in parallel threads gives the same result)
+            myclass.__categorical_cache = attrs
+        return attrs
 
     def get_attr(self, name):
         """Return the value of the given attribute.
@@ -190,7 +333,7 @@ class Node(object):
             path = path.split('/')
             obj = getattr(self, Node.__safe_name(attr))
             for step in path:
-                if type(obj) != dict:
+                if type(obj) != dict and not isinstance(obj, FeatureBundle):
                     return None
                 obj = obj.get(step)
             return obj
@@ -207,28 +350,43 @@ class Node(object):
             # prepare the attribute as a dict
             attr, path = name.split('/', 1)
             path = path.split('/')
+            # the dict will be changed in place, so the journal needs a copy
+            if self.__document is not None and self.__document.journal is not None:
+                safe_attr = Node.__safe_name(attr)
+                old_value = self.__dict__.get(safe_attr)
+                if old_value is not None:
+                    self.__document.journal.record(Node._restore_attr, self, safe_attr,
+                                                   copy.deepcopy(old_value))
             obj = getattr(self, Node.__safe_name(attr))
-            if type(obj) != dict:
-                obj = {}
-                setattr(self, Node.__safe_name(attr), obj)
+            if type(obj) != dict and not isinstance(obj, FeatureBundle):
+                setattr(self, Node.__safe_name(attr), {})
+                # (feature bundle attributes convert the dict)
+                obj = getattr(self, Node.__safe_name(attr))
             # build dict path up to the last level
             for step in path[:-1]:
                 if step not in obj:
                     obj[step] = {}
                 obj = obj[step]
             # set the value
+            if attr in self.get_categorical_attrs():
+                value = Node.symbols.intern(value)
             obj[path[-1]] = value
         # plain attributes
         else:
+            if name in self.get_categorical_attrs():
+                if isinstance(value, dict):
+                    value = Node.symbols.intern_values(value)
+                else:
+                    value = Node.symbols.intern(value)
             setattr(self, Node.__safe_name(name), value)
 
     def set_deref_attr(self, name, value):
         """This assumes the value is a node/list of nodes and
         sets its id/their ids as the value of the given attribute."""
         if type(value) == list:
-            self.set_attr(name, [node.id for node in value])
+            self.set_attr(name, [node.__id for node in value])
         else:
-            self.set_attr(name, value.id)
+            self.set_attr(name, value.__id)
 
     def get_deref_attr(self, name):
         """This assumes the given attribute holds node id(s) and
@@ -245,7 +403,7 @@ class Node(object):
         their reference types in a hash."""
         ret = {'alignment': []}
         for align in self.alignment:
-            ret['alignment'].add(align['counterpart.rf'])
+            ret['alignment'].append(align['counterpart.rf'])
         for attr in self.get_ref_attr_list():
             value = self.get_attr(attr)
             if not value:
@@ -253,21 +411,53 @@ class Node(object):
             ret[attr] = as_list(value)
         return ret
 
+    def get_rendered_attr(self, name):
+        """\
+        Return the value of the given attribute, with all node references
+        in their string form (used for serialization, see Node.ref_id).
+        """
+        value = self.get_attr(name)
+        if not value or self.document is None:
+            return value
+        render = self.document.render_id
+        if name == 'alignment':
+            value = [dict(ref) for ref in value]
+            for ref in value:
+                ref['counterpart.rf'] = render(ref['counterpart.rf'])
+            return value
+        reference = self.get_ref_attr_list(split_nested=True).get(name)
+        if not reference:
+            return value
+        if isinstance(reference, dict):
+            value = dict(value)
+            refd_attrs = [key for key in value if key in reference]
+        else:
+            value, refd_attrs = {name: value}, [name]
+        for key in refd_attrs:
+            if isinstance(value[key], list):
+                value[key] = [render(node_id) for node_id in value[key]]
+            elif value[key] is not None:
+                value[key] = render(value[key])
+        return value if isinstance(reference, dict) else value[name]
+
     def get_referencing_nodes(self, attr_name):
         return [self.document.get_node_by_id(node_id)
-                for node_id in self.document.get_backref(attr_name, self.id)]
+                for node_id in self.document.get_backref(attr_name, self.__id)]
 
     def remove_reference(self, ref_type, refd_id):
         "Remove the reference of the given type to the given node."
+        # references may also hold the string form of the id
+        ref_id = self.document.get_ref_id
         # handle alignment separately
         if ref_type == 'alignment':
             refs = self.get_attr('alignment')
             self.set_attr('alignment', [ref for ref in refs if
-                                        ref['counterpart.rf'] != refd_id])
+                                        ref_id(ref['counterpart.rf']) != refd_id])
+            return
         # handle plain attributes and lists
         refs = self.get_attr(ref_type)
         if isinstance(refs, list):
-            self.set_attr(ref_type, [ref for ref in refs if ref != refd_id])
+            self.set_attr(ref_type, [ref for ref in refs if ref_id(ref) != refd_id])
         else:
             self.set_attr(ref_type, None)
 
@@ -333,18 +523,187 @@ class Node(object):
         return getattr(sys.modules[__name__],
                        self.__class__.__name__)(data=data, parent=self)
 
+    def clone_subtree(self, parent=None, zone=None):
+        """\
+        Copy this node with its whole subtree, either as a new child of the
+        given parent, or as a new tree (on the same layer) in the given zone.
+        Return the copy of this node (or the new root).
+
+        Attribute values are copied in bulk, bypassing the constructor and
+        set_attr. The copies get new ids; references between nodes of the
+        subtree are redirected to the respective copies, references to other
+        nodes are kept. In the zone case, the new root keeps its own id.
+        """
+        if parent is None and zone is None:
+            raise RuntimeException('Parent or zone must be given to clone a subtree.')
+        attr_lists = {}
+        id_map = {}
+        clones = []
+        if parent is None:
+            # a new tree: create the root and copy attributes into it
+            layer = re.sub(r'^.*\.', '', self.__class__.__name__.lower())
+            root_clone = zone.create_tree(layer)
+            self.__copy_attrs_to(root_clone, attr_lists)
+            id_map[self.__id] = root_clone.__id
+            stack = [(child, root_clone) for child in reversed(self.__children)]
+        else:
+            root_clone = None
+            stack = [(self, parent)]
+        # copy nodes and structure (depth-first, keeping the children order)
+        while stack:
+            source, target_parent = stack.pop()
+            clone = source.__class__.__new__(source.__class__)
+            clone.__zone = target_parent.__zone
+            clone.__document = target_parent.__document
+            clone.__parent = target_parent
+            clone.__root = target_parent.__root
+            clone.__children = []
+            source.__copy_attrs_to(clone, attr_lists)
+            clone.__id = clone.__generate_id()
+            id_map[source.__id] = clone.__id
+            if clone.__document is not None and clone.__document.journal is not None:
+                clone.__document.journal.record(Node._restore_attr, target_parent,
+                                                '_Node__children',
+                                                list(target_parent.__children))
+            target_parent.__children.append(clone)
+            clones.append(clone)
+            stack.extend((child, clone) for child in reversed(source.__children))
+        # redirect internal references, then index all new nodes
+        for clone in ([root_clone] if root_clone is not None else []) + clones:
+            clone.__redirect_refs(id_map)
+            if clone.__document is not None:
+                clone.__document.index_node(clone)
+        for clone in clones:
+            clone._register_clone()
+        if clones:
+            clones[0]._invalidate_tree_indexes()
+        return root_clone if root_clone is not None else clones[0]
+
+    def __copy_attrs_to(self, target, attr_lists):
+        "Copy all attribute values of this node to the target node."
+        attrs = attr_lists.get(self.__class__)
+        if attrs is None:
+            # attribute names and whether their values need to be copied
+            attrs = attr_lists[self.__class__] = [
+                (safe_attr, atype in (dict, list) or type(atype) is FeatureBundleMeta)
+                for (_, atype), safe_attr
+                in zip(self.get_attr_list(include_types=True),
+                       self.get_attr_list(safe=True))]
+        values = self.__dict__
+        # the target is a new node or a new tree root, no need for journaling
+        target.__dict__.update((attr, Node.__copy_value(values.get(attr)) if nested
+                                else values.get(attr)) for attr, nested in attrs)
+
+    @staticmethod
+    def __copy_value(value):
+        "Copy an attribute value (recursively for dicts and lists)."
+        if isinstance(value, dict):
+            return dict((key, Node.__copy_value(val)) for key, val in value.items())
+        if isinstance(value, list):
+            return [Node.__copy_value(val) for val in value]
+        if isinstance(value, FeatureBundle):
+            return value.copy()
+        return value
+
+    def __redirect_refs(self, id_map):
+        """\
+        Redirect references to nodes contained in the given old id -> new id
+        map (without tracking the references, the node is not indexed yet).
+        """
+        for ref in self.alignment:
+            ref['counterpart.rf'] = id_map.get(ref['counterpart.rf'],
+                                               ref['counterpart.rf'])
+        for attr in self.get_ref_attr_list():
+            if '/' in attr:
+                attr, key = attr.split('/', 1)
+                container = self.__dict__.get(Node.__safe_name(attr))
+                if not isinstance(container, dict):
+                    continue
+            else:
+                container, key = self.__dict__, Node.__safe_name(attr)
+            value = container.get(key)
+            if isinstance(value, list):
+                container[key] = [id_map.get(val, val) for val in value]
+            elif value is not None:
+                container[key] = id_map.get(value, value)
+
+    def _register_clone(self):
+        "Called for each new node created by clone_subtree (to be overridden if needed)."
+        pass
+
     def remove(self, fix_order=True):
-        "Remove the node from the tree."
-        root = self.root # backup, self.root will not be reliable (why?)
-        for child in self.get_children():
-            child.remove(fix_order=False)
-        self.parent = None
-        self.document.remove_node(self.id)
+        "Remove the node (with its whole subtree) from the tree."
+        Node.remove_many([self], fix_order)
 
+    @staticmethod
+    def remove_many(nodes, fix_order=True):
+        """\
+        Remove any number of nodes (with their whole subtrees) at once.
+        The document indexes are updated in bulk and the ordering of each
+        affected tree is normalized only once, after all the removals.
+        """
+        removed = set()
+        removed_by_doc = {}
+        roots = {}
+        for node in nodes:
+            # skip nodes already removed with a subtree of a previous one
+            if node.__id in removed:
+                continue
+            root = node.root  # backup, node.root will not be reliable
+            subtree_ids = node._detach_for_removal()
+            removed.update(subtree_ids)
+            removed_by_doc.setdefault(id(node.document), (node.document, []))[1].extend(subtree_ids)
+            if fix_order and isinstance(node, Ordered):
+                roots[id(root)] = root
+        for document, node_ids in removed_by_doc.values():
+            document.remove_nodes(node_ids)
         # We need to normalize ordering, so there are no gaps
-        if fix_order and isinstance(self, Ordered):
-            for new_ord, node in enumerate(root.get_descendants(add_self=True, ordered=True)):
-                node.ord = new_ord
+        # (edit batches normalize it on their own at the end)
+        for root in roots.values():
+            if root._edit_batch is None:
+                root.normalize_order()
+
+    def _detach_for_removal(self):
+        """\
+        Detach the node from its parent before removal, return the ids
+        of its whole subtree (to be removed from the document indexes).
+        """
+        subtree_ids = [node.__id for node in self.get_descendants(add_self=True)]
+        self.parent = None
+        return subtree_ids
+
+    @contextmanager
+    def batch_edits(self):
+        """\
+        Batch edits of the whole tree this node belongs to (use as
+        `with aroot.batch_edits():`).
+
+        Inside the batch, shifting nodes only places them between their
+        new neighbors instead of renumbering the whole tree, so ord values
+        keep the right order but may not be integers (and should not be
+        set directly). The ordering is
+        normalized once at the end of the batch. Checks for cycles on
+        changing node parents are also done just once, at the end.
+        Batches may be nested; only the outermost one has any effect.
+        If the body of the batch raises an exception, the batch is just
+        ended and the exception passed on (the ordering is not normalized
+        and cycles are not checked).
+        """
+        root = self.root
+        if root._edit_batch is not None:
+            yield root._edit_batch
+            return
+        batch = EditBatch(root)
+        root._edit_batch = batch
+        try:
+            yield batch
+        except BaseException:
+            del root._edit_batch
+            raise
+        del root._edit_batch
+        if isinstance(root, Ordered):
+            root.normalize_order()
+        batch.check_cycles()
 
     def is_descendant_of(self, another_node):
         "Is this node a descendant of another node?"
@@ -376,20 +735,40 @@ class Node(object):
         if value is not None:
             if self.__document != value.__document:
                 raise RuntimeException('Cannot move nodes across documents.')
-            if (value.is_descendant_of(self) or value is self):
+            batch = value.__root._edit_batch
+            if batch is not None:
+                batch.moved.append(self)
+            elif (value.is_descendant_of(self) or value is self):
                 raise RuntimeException('Attempt to create cycle with nodeA.parent = descendant_of_nodeA.')
         # filter original parent's children
         if self.__parent:
             self.__parent.__children = [child for child
                                         in self.__parent.__children
-                                        if child != self]
-        # set new parent and update its children, set new root
+                                        if child is not self]
+            self._invalidate_tree_indexes()
+        # set new parent and update its children
         self.__parent = value
         if self.__parent:
+            if self.__document is not None and self.__document.journal is not None:
+                self.__document.journal.record(Node._restore_attr, self.__parent,
+                                               '_Node__children',
+                                               list(self.__parent.__children))
             self.__parent.__children.append(self)
-            self.__root = self.__parent.__root
+            new_root = self.__parent.__root
         else:
-            self.__root = self
+            new_root = self
+        # set new root (for the whole subtree, if it changed)
+        if self.__dict__.get('_Node__root') is not new_root:
+            for node in self.__descs_and_self_unsorted():
+                node.__root = new_root
+        self._invalidate_tree_indexes()
+
+    def _invalidate_tree_indexes(self):
+        "Drop all indexes cached on the root of this node's tree."
+        root = self.__dict__.get('_Node__root')
+        if root is not None:
+            for index_name in Node.tree_indexes:
+                root.__dict__.pop(index_name, None)
 
     def get_depth(self):
         "Return the depth, i.e. the distance to the root."
@@ -402,7 +781,12 @@ class Node(object):
 
     @property
     def id(self):
-        "The unique id of the node within the document."
+        """\
+        The unique id of the node within the document, as a string (IDs
+        generated for new nodes are rendered on request, see ref_id).
+        """
+        if isinstance(self.__id, int):
+            return self.__render_id(self.__id)
         return self.__id
 
     @id.setter
@@ -411,6 +795,16 @@ class Node(object):
         if self.__document:
             self.__document.index_node(self)
 
+    @property
+    def ref_id(self):
+        """\
+        The id of the node as used in references and document indexes: the
+        original string for IDs loaded from data, an integer (combining the
+        bundle order and a number of the node within the bundle) for
+        generated IDs.
+        """
+        return self.__id
+
     @property
     def zone(self):
         "The zone this node belongs to."
@@ -423,11 +817,12 @@ class Node(object):
 
     def __eq__(self, other):
         "Node comparison by id"
-        return other is not None and self.id == other.id
+        return other is not None and self.__id == other.__id and \
+            self.__document is other.__document
 
     def __ne__(self, other):
         "Node comparison by id"
-        return other is None or self.id != other.id
+        return not self == other
 
     def __lt__(self, other):
         "Node ordering is only implemented in Ordered"
@@ -453,6 +848,140 @@ class Node(object):
             return NotImplemented
         return Ordered.__ge__(self, other)
 
+    def _pack_tree(self, strings):
+        """\
+        Return the tree of this node (a root) flattened for pickling: the IDs
+        of its nodes in depth-first order, an array of the indexes of their
+        parents, a column of values for each attribute (None if all values
+        are the defaults, an array for booleans, integers and strings coded
+        in the given StringTable, packed feature bundles (see
+        FeatureBundle.pack_column), a list otherwise) and a dict of any other
+        values kept on nodes (such as AMR variables), by node index.
+        """
+        nodes = []
+        parents = array(str('l'))
+        stack = [(self, -1)]
+        while stack:
+            node, parent = stack.pop()
+            parents.append(parent)
+            stack.extend((child, len(nodes)) for child in reversed(node.__children))
+            nodes.append(node)
+        safe_attrs = self.get_attr_list(safe=True)
+        try:
+            get_values = itemgetter(*safe_attrs)
+            rows = [get_values(node.__dict__) for node in nodes]
+        except KeyError:  # attributes deleted from some nodes
+            rows = [tuple(node.__dict__.get(safe_attr) for safe_attr in safe_attrs)
+                    for node in nodes]
+        columns = [Node._pack_column(list(values), att_type, strings)
+                   for (_, att_type), values
+                   in zip(self.get_attr_list(include_types=True), zip(*rows))]
+        known = set(safe_attrs) | set(self.tree_indexes) | set(['_edit_batch'])
+        # (nodes usually only have their attributes and the six links and ID)
+        usual = len(safe_attrs) + 6
+        extras = {}
+        for index, node in enumerate(nodes):
+            if len(node.__dict__) == usual:
+                continue
+            extra = dict((key, value) for key, value in node.__dict__.items()
+                         if key not in known and not key.startswith('_Node__'))
+            if extra:
+                extras[index] = extra
+        return [node.__id for node in nodes], parents, columns, extras
+
+    @staticmethod
+    def _pack_column(values, att_type, strings):
+        "Return the packed column of the given values of an attribute of the given type (see _pack_tree)."
+        types = set(map(type, values))
+        default = Node.__get_default(att_type)
+        if types == set([type(default)]) and values.count(default) == len(values):
+            return None
+        if type(att_type) is FeatureBundleMeta and not types - set([att_type, type(None)]):
+            return att_type.pack_column(values)
+        value_type = types.pop() if len(types) == 1 else None
+        if value_type is bool:
+            return array(str('b'), values)
+        if value_type is int:
+            try:
+                return array(str('l'), values)
+            except OverflowError:
+                return values
+        return strings.encode(values) or values
+
+    @staticmethod
+    def _unpack_column(column, att_type, strings, categorical=False):
+        """\
+        Return the list of values of an attribute of the given type packed by
+        _pack_column (not None), interning the strings of categorical ones.
+        """
+        if isinstance(column, tuple):
+            return att_type.unpack_column(column)
+        if isinstance(column, array):
+            if column.typecode == 'b':  # booleans
+                return [bool(value) for value in column]
+            if column.typecode == 'l':  # integers
+                return column.tolist()
+            # string codes
+            return strings.decode(column, Node.symbols if categorical else None)
+        if att_type == dict and categorical:
+            for value in column:
+                if value:
+                    Node.symbols.intern_values(value)
+        return column
+
+    @staticmethod
+    def __get_default(att_type):
+        "Return the value the constructor sets for an attribute of the given type if not given."
+        if att_type == dict:
+            return {}
+        if att_type == list:
+            return []
+        if att_type == bool:
+            return False
+        if type(att_type) is FeatureBundleMeta:
+            return att_type(None)
+        return None
+
+    @classmethod
+    def _unpack_tree(cls, state, zone, strings):
+        """\
+        Rebuild a tree of this class packed by _pack_tree in the given zone,
+        return its root. The nodes are indexed in the zone's document.
+        """
+        ids, parents, columns, extras = state
+        document = zone.document if zone is not None else None
+        nodes = [cls.__new__(cls) for _ in ids]
+        root = nodes[0]
+        for node, node_id, parent in zip(nodes, ids, parents):
+            node.__dict__.update({'_Node__id': node_id, '_Node__zone': zone,
+                                  '_Node__document': document, '_Node__root': root,
+                                  '_Node__parent': nodes[parent] if parent >= 0 else None,
+                                  '_Node__children': []})
+            if parent >= 0:
+                nodes[parent].__children.append(node)
+        categorical = root.get_categorical_attrs()
+        for (attr, att_type), safe_attr, column in zip(root.get_attr_list(include_types=True),
+                                                       root.get_attr_list(safe=True),
+                                                       columns):
+            if column is None:
+                default = Node.__get_default(att_type)
+                if default is None or default is False:
+                    for node in nodes:
+                        node.__dict__[safe_attr] = default
+                else:
+                    for node in nodes:
+                        node.__dict__[safe_attr] = copy.copy(default)
+                continue
+            column = Node._unpack_column(column, att_type, strings, attr in categorical)
+            for node, value in zip(nodes, column):
+                node.__dict__[safe_attr] = value
+        for index, extra in extras.items():
+            nodes[index].__dict__.update(extra)
+        if document is not None:
+            for node in nodes:
+                document.index_node(node)
+        return root
+
 
 class Ordered(object):
     """\
@@ -475,6 +1004,25 @@ class Ordered(object):
     def __ge__(self, other):
         return self.ord >= other.ord
 
+    @staticmethod
+    def order_key(node):
+        "Sorting key for nodes by ord (nodes with no ord set go first)."
+        return (node.ord is not None, node.ord)
+
+    def _invalidate_order(self):
+        "Let the indexes cached for this node's tree know the order changed."
+        clause_index = self.root.__dict__.get('_clause_index')
+        if clause_index is not None:
+            clause_index.order_changed()
+
+    def normalize_order(self):
+        "Renumber the ordering of the whole tree so that there are no gaps."
+        nodes = self.root.get_descendants(add_self=True)
+        nodes.sort(key=Ordered.order_key)
+        for new_ord, node in enumerate(nodes):
+            node.ord = new_ord
+        self._invalidate_order()
+
     def shift_after_node(self, other, without_children=False):
         "Shift one node after another in the ordering."
         self.__shift_to_node(other, after=True, without_children=without_children)
@@ -514,15 +1062,21 @@ class Ordered(object):
             return
         if not without_children and other.is_descendant_of(self):
             raise RuntimeException('{} is a descendant of {}. Maybe you have forgotten without_children=True.'.format(other.id, self.id))
-        all_nodes = self.root.get_descendants(ordered=True, add_self=True)
         # determine what's being moved
-        to_move = [self] if without_children else self.get_descendants(ordered=True, add_self=True)
-        moving = set(to_move)
+        to_move = [self] if without_children else self.get_descendants(add_self=True)
+        to_move.sort(key=Ordered.order_key)
+        # just place the nodes between their new neighbors in edit batches
+        if self.root._edit_batch is not None:
+            self.root._edit_batch.shift(to_move, other, after)
+            return
+        all_nodes = self.root.get_descendants(add_self=True)
+        all_nodes.sort(key=Ordered.order_key)
+        moving = set(id(node) for node in to_move)
         # do the moving
         cur_ord = 0
         for node in all_nodes:
             # skip nodes moved, handle them when we're at the reference node
-            if node in moving:
+            if id(node) in moving:
                 continue
             if after:
                 node.ord = cur_ord
@@ -535,6 +1089,7 @@ class Ordered(object):
             if not after:
                 node.ord = cur_ord
                 cur_ord += 1
+        self._invalidate_order()
 
     def get_next_node(self):
         "Get the following node in the ordering."
@@ -586,12 +1141,135 @@ class Ordered(object):
         return self.parent.ord < self.ord
 
 
+class EditBatch(object):
+    """\
+    Edits of a tree being batched (see Node.batch_edits), keeping track
+    of nodes moved to new parents and of the ordering.
+    """
+
+    # smallest gap between ords of neighboring nodes before renumbering
+    MIN_GAP = 1e-6
+
+    def __init__(self, root):
+        self.root = root
+        self.moved = []
+        # sorted ords of all nodes in the tree (once shifting starts)
+        self.ords = None
+
+    def shift(self, to_move, other, after):
+        """\
+        Shift the given nodes (in this order) just before or after another
+        node, assigning them ords between the ords of their new neighbors.
+        """
+        if self.ords is None or other.ord is None:
+            self.__renumber()
+        lower, upper = self.__neighbor_ords(to_move, other, after)
+        if float(upper - lower) / (len(to_move) + 1) < self.MIN_GAP:
+            self.__renumber()
+            lower, upper = self.__neighbor_ords(to_move, other, after)
+        step = float(upper - lower) / (len(to_move) + 1)
+        for num, node in enumerate(to_move, start=1):
+            node.ord = lower + num * step
+            insort(self.ords, node.ord)
+        self.root._invalidate_order()
+
+    def __renumber(self):
+        "Renumber the tree, placing nodes with no ord (start shifting)."
+        nodes = self.root.get_descendants(add_self=True)
+        nodes.sort(key=Ordered.order_key)
+        for new_ord, node in enumerate(nodes):
+            node.ord = new_ord
+        self.ords = list(range(len(nodes)))
+        self.root._invalidate_order()
+
+    def __neighbor_ords(self, to_move, other, after):
+        """\
+        Take the nodes to be moved out of the ordering, return ords of
+        the nodes between which they will be placed (one of them is the
+        other node).
+        """
+        ords = self.ords
+        for node in to_move:
+            if node.ord is None:
+                continue
+            pos = bisect_left(ords, node.ord)
+            if pos < len(ords) and ords[pos] == node.ord:
+                del ords[pos]
+        other_ord = other.ord
+        if after:
+            pos = bisect_right(ords, other_ord)
+            return other_ord, ords[pos] if pos < len(ords) else other_ord + 1
+        pos = bisect_left(ords, other_ord)
+        return ords[pos - 1] if pos > 0 else other_ord - 1, other_ord
+
+    def check_cycles(self):
+        "Check that no cycles were created by moving nodes to new parents."
+        for node in self.moved:
+            visited = set()
+            ancestor = node.parent
+            while ancestor is not None:
+                if ancestor is node or id(ancestor) in visited:
+                    raise RuntimeException('Attempt to create cycle with ' +
+                                           'nodeA.parent = descendant_of_nodeA.')
+                visited.add(id(ancestor))
+                ancestor = ancestor.parent
+
+
+class StructuralAttr(object):
+    """\
+    Descriptor for node attributes that indexes of the tree structure
+    depend on (such as is_member). The value is kept in the node's
+    dictionary under the attribute's own name; setting it drops the
+    indexes cached on the tree root.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, node, owner):
+        if node is None:
+            return self
+        try:
+            return node.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, node, value):
+        node.__dict__[self.name] = value
+        node._invalidate_tree_indexes()
+
+
+class EffectiveRelationsIndex(object):
+    """\
+    Effective children and parents and coordination members of the nodes
+    of one tree. Each of them is computed once per node on the first
+    request and kept until the structure of the tree changes (the index is
+    cached on the tree root, see EffectiveRelations).
+    """
+
+    def __init__(self):
+        self.echildren = {}
+        self.eparents = {}
+        self.coap_members = {}
+
+
 class EffectiveRelations(object):
     "Representing a node with effective relations"
 
     attrib = [('is_member', bool)]
     ref_attrib = []
 
+    is_member = StructuralAttr('is_member')
+
+    def __get_eff_index(self):
+        "Return the effective relations index of this node's tree."
+        root = self.root
+        index = root.__dict__.get('_eff_index')
+        if index is None:
+            # not an attribute of the tree, bypass journaling
+            index = root.__dict__['_eff_index'] = EffectiveRelationsIndex()
+        return index
+
     def is_coap_root(self):
         """\
         Testing whether the node is a coordination/apposition root.
@@ -610,23 +1288,25 @@ class EffectiveRelations(object):
                                      preceding_only, following_only)
         # my own effective children
         # (I am their only parent) & shared effective children
-        echildren = self.__get_my_own_echildren() + self.__get_shared_echildren()
+        cache = self.__get_eff_index().echildren
+        echildren = cache.get(id(self))
+        if echildren is None:
+            echildren = self.__get_my_own_echildren() + self.__get_shared_echildren()
+            cache[id(self)] = echildren
         # final filtering
-        return self._process_switches(echildren, add_self, ordered,
+        return self._process_switches(list(echildren), add_self, ordered,
                                       preceding_only, following_only)
 
     def __can_apply_eff(self, or_topological):
         """Return true if the given node is OK for effective relations
         to be applied, false otherwise."""
         if self.is_coap_root():
-            caller_name = inspect.stack()[1][3]
-            message = caller_name + ' called on coap_root (' + self.id + ').'
-            if or_topological:
-                return False
-            else:
+            if not or_topological:
                 # this should not happen, so warn about it
-                log_warn(message + ' Fallback to topological.')
-                return False
+                caller_name = sys._getframe(1).f_code.co_name
+                log_warn(caller_name + ' called on coap_root (' + self.id + ').' +
+                         ' Fallback to topological.')
+            return False
         return True
 
     def __get_my_own_echildren(self):
@@ -664,15 +1344,19 @@ class EffectiveRelations(object):
         Otherwise return the node itself."""
         if not self.is_coap_root():
             return [self]
-        queue = deque([node for node in self.get_children() if node.is_member])
-        members = []
-        while queue:
-            node = queue.popleft()
-            if node.is_coap_root():
-                queue.extend([node for node in node.get_children() if node.is_member])
-            else:
-                members.append(node)
-        return members
+        cache = self.__get_eff_index().coap_members
+        members = cache.get(id(self))
+        if members is None:
+            queue = deque([node for node in self.get_children() if node.is_member])
+            members = []
+            while queue:
+                node = queue.popleft()
+                if node.is_coap_root():
+                    queue.extend([node for node in node.get_children() if node.is_member])
+                else:
+                    members.append(node)
+            cache[id(self)] = members
+        return list(members)
 
     def get_eparents(self, or_topological=False,
                      add_self=False, ordered=False,
@@ -681,7 +1365,11 @@ class EffectiveRelations(object):
         # test if we can get e-parents
         if not self.__can_apply_eff(or_topological):
             return [self.parent]
-        return self._process_switches(self.__get_eparents(), add_self,
+        cache = self.__get_eff_index().eparents
+        eparents = cache.get(id(self))
+        if eparents is None:
+            eparents = cache[id(self)] = self.__get_eparents()
+        return self._process_switches(list(eparents), add_self,
                                       ordered, preceding_only, following_only)
 
     def __get_eparents(self):
@@ -720,6 +1408,69 @@ class EffectiveRelations(object):
         return self.parent
 
 
+class ClauseIndex(object):
+    """\
+    Clause structure of one tree: nodes of each clause in the sentence order,
+    clause boundaries and clause roots. Cached on the tree root until the
+    tree structure changes (see InClause); the parts that depend on the node
+    order are recomputed in one pass after nodes are shifted. Setting ord
+    values directly (instead of shifting nodes or normalizing the order)
+    does not update the index.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        # highest nodes within the clause above nodes, clause roots
+        self.highest = {}
+        self.clause_roots = {}
+        self.order_changed()
+
+    def order_changed(self):
+        "Forget the parts of the index that depend on the node order."
+        self.nodes = None
+        self.clause_numbers = None
+        self.members = None
+        self.boundaries = None
+
+    def __index_order(self):
+        "Divide the nodes into clauses and find the clause boundaries."
+        if self.nodes is not None:
+            return
+        self.nodes = self.root.get_descendants()
+        self.nodes.sort(key=Ordered.order_key)
+        # clause numbers in the order of their first nodes, nodes by clause
+        self.clause_numbers = []
+        self.members = {}
+        for node in self.nodes:
+            members = self.members.get(node.clause_number)
+            if members is None:
+                members = self.members[node.clause_number] = []
+                self.clause_numbers.append(node.clause_number)
+            members.append(node)
+        # pairs of neighboring nodes belonging to different clauses
+        self.boundaries = [(left, right) for left, right
+                           in zip(self.nodes[:-1], self.nodes[1:])
+                           if left.clause_number != right.clause_number]
+
+    def get_clause_numbers(self):
+        "Return all clause numbers in the order of the first nodes of clauses."
+        self.__index_order()
+        return list(self.clause_numbers)
+
+    def get_members(self, clause_number):
+        "Return all nodes of the given clause, in the sentence order."
+        self.__index_order()
+        return list(self.members.get(clause_number, []))
+
+    def get_boundaries(self):
+        """\
+        Return all pairs of neighboring nodes (in the sentence order) that
+        belong to different clauses.
+        """
+        self.__index_order()
+        return list(self.boundaries)
+
+
 class InClause(object):
     "Represents nodes that are organized in clauses"
 
@@ -727,18 +1478,55 @@ class InClause(object):
               ('is_clause_head', bool)]
     ref_attrib = []
 
+    clause_number = StructuralAttr('clause_number')
+
+    def get_clause_index(self):
+        "Return the clause index of this node's tree."
+        root = self.root
+        index = root.__dict__.get('_clause_index')
+        if index is None:
+            # not an attribute of the tree, bypass journaling
+            index = root.__dict__['_clause_index'] = ClauseIndex(root)
+        return index
+
     def get_clause_root(self):
         "Return the root of the clause the current node resides in."
         # default to self if clause number is not defined
         if self.clause_number is None:
             log_warn('Clause number undefined in: ' + self.id)
             return self
-        highest = self
-        parent = self.parent
+        index = self.get_clause_index()
+        clause_root = index.clause_roots.get(id(self))
+        if clause_root is None:
+            clause_root = index.clause_roots[id(self)] = self.__find_clause_root(index)
+        return clause_root
+
+    def __get_highest_in_clause(self, index):
+        """\
+        Return the highest node above this one (or this one) within its
+        clause, remembering the result for all nodes on the way.
+        """
+        path = []
+        node = self
+        while True:
+            highest = index.highest.get(id(node))
+            if highest is not None:
+                break
+            path.append(node)
+            parent = node.parent
+            if not parent or parent.clause_number != self.clause_number:
+                highest = node
+                break
+            node = parent
+        for node in path:
+            index.highest[id(node)] = highest
+        return highest
+
+    def __find_clause_root(self, index):
+        "Find the root of the clause the current node resides in."
         # move as high as possible within the clause
-        while parent and parent.clause_number == self.clause_number:
-            highest = parent
-            parent = parent.parent
+        highest = self.__get_highest_in_clause(index)
+        parent = highest.parent
         # handle coordinations - shared attributes
         if parent and parent.is_coap_root() and not highest.is_member:
             try:
@@ -757,7 +1545,7 @@ class T(Node, Ordered, EffectiveRelations, InClause):
     attrib = [('functor', str), ('formeme', str),
               ('t_lemma', str), ('nodetype', str),
               ('subfunctor', str), ('tfa', str),
-              ('is_dsp_root', bool), ('gram', dict),
+              ('is_dsp_root', bool), ('gram', Grammatemes),
               ('a', dict), ('compl.rf', list),
               ('coref_gram.rf', list),
               ('coref_text.rf', list),
@@ -774,6 +1562,13 @@ class T(Node, Ordered, EffectiveRelations, InClause):
               ('is_reflexive', bool)]
     ref_attrib = ['a/lex.rf', 'a/aux.rf', 'compl.rf', 'coref_gram.rf',
                   'coref_text.rf']
+    categorical_attrib = ['functor', 'formeme', 'nodetype', 'subfunctor',
+                          'tfa', 'sentmod', 'voice', 'mlayer_pos',
+                          't_lemma_origin', 'formeme_origin']
+
+    # coordinations are determined by functors
+    functor = StructuralAttr('functor')
+    gram = FeatureAttr('gram', Grammatemes)
 
     def __init__(self, data=None, parent=None, zone=None):
         "Constructor"
@@ -987,7 +1782,7 @@ class T(Node, Ordered, EffectiveRelations, InClause):
         TODO evaluate thoroughly"""
         if self is other:  # same object (address)
             return True
-        if self.id and other.id and self.id == other.id:  # same IDs
+        if self.ref_id and other.ref_id and self.ref_id == other.ref_id:  # same IDs
             return True
         return hash(self) == hash(other)  # same tree under different/no ID
 
@@ -1017,7 +1812,7 @@ class A(Node, Ordered, EffectiveRelations, InClause):
     attrib = [('form', str), ('lemma', str),
               ('tag', str), ('afun', str),
               ('no_space_after', bool),
-              ('morphcat', dict),
+              ('morphcat', Morphcat), ('iset', Interset),
               ('is_parenthesis_root', bool),
               ('edge_to_collapse', bool),
               ('is_auxiliary', bool),
@@ -1027,10 +1822,16 @@ class A(Node, Ordered, EffectiveRelations, InClause):
               ('deps', str), ('misc', str),
               ]
     ref_attrib = ['p_terminal.rf']
+    categorical_attrib = ['tag', 'afun', 'upos', 'xpos', 'feats', 'deprel']
+
+    # coordinations are determined by afuns
+    afun = StructuralAttr('afun')
+    morphcat = FeatureAttr('morphcat', Morphcat)
+    iset = FeatureAttr('iset', Interset)
 
-    morphcat_members = ['pos', 'subpos', 'gender', 'number', 'case', 'person',
-                        'tense', 'negation', 'voice', 'grade', 'mood',
-                        'possnumber', 'possgender']
+    morphcat_members = Morphcat.categories
+    # all morphcat members set to '.' (see reset_morphcat)
+    morphcat_empty = Morphcat((category, '.') for category in morphcat_members)
 
     def __init__(self, data=None, parent=None, zone=None):
         "Constructor"
@@ -1042,8 +1843,9 @@ class A(Node, Ordered, EffectiveRelations, InClause):
 
     def reset_morphcat(self):
         "Reset the morphcat structure members to '.'"
-        for category in A.morphcat_members:
-            self.set_attr('morphcat/' + category, '.')
+        morphcat = self.morphcat.copy() if self.morphcat is not None else Morphcat()
+        morphcat.update(A.morphcat_empty)
+        self.set_attr('morphcat', morphcat)
 
     @property
     def morphcat_pos(self):
@@ -1607,6 +2409,7 @@ class N(Node):
               ('normalized_name', str),
               ('a.rf', list), ]
     ref_attrib = ['a.rf']
+    categorical_attrib = ['ne_type']
 
     def __init__(self, data=None, parent=None, zone=None):
         "Constructor"
@@ -1622,6 +2425,7 @@ class P(Node):
               ('tag', str), ('phrase', str),
               ('functions', list), ]
     ref_attrib = []
+    categorical_attrib = ['tag', 'phrase', 'edgelabel']
 
     def __init__(self, data=None, parent=None, zone=None):
         "Constructor"
@@ -1637,6 +2441,7 @@ class AMR(Node, Ordered):
               ('is_ne_head', bool), ('is_ne_subnode', bool)]
 
     ref_attrib = ['src_tnode.rf', 'coref.rf']
+    categorical_attrib = ['nodetype', 'modifier']
 
     def __init__(self, data=None, parent=None, zone=None):
         "Constructor"
@@ -1685,10 +2490,17 @@ class AMR(Node, Ordered):
             else:
                 self.root._allocate_var(self)
 
-    def remove(self):
+    def _register_clone(self):
+        # allocate the variable name in the new tree, same as in the parent setter
+        if self.varname == 'auto' or self.varname is None and self.nodetype == 'var':
+            self.set_auto_var()
+        else:
+            self.root._allocate_var(self)
+
+    def _detach_for_removal(self):
         self.root._free_var(self)
         # super -- do the actual removal
-        Node.remove(self)
+        return Node._detach_for_removal(self)
 
     def set_auto_var(self):
         """Compute automatic variable name (using the first free number for the 1st letter
@@ -0,0 +1,430 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Declarative queries for nodes matching structural patterns
+#
+from __future__ import unicode_literals
+from builtins import object
+from multiprocessing.pool import ThreadPool
+from operator import attrgetter, methodcaller
+from pytreex.core.exception import RuntimeException
+from pytreex.core.node import Ordered
+
+
+class Pattern(object):
+    """\
+    A pattern of a node: constraints on its attributes and on other nodes
+    in the same tree related to it.
+
+    Attribute constraints are given as a dict (which allows nested names,
+    e.g. 'gram/number') and/or keyword arguments. A constraint value may be
+    a constant (the attribute must be equal to it), a set, list or tuple
+    (the attribute must be one of its members) or a function (called with
+    the attribute value, must return True).
+
+    Related nodes are added by the relation methods (parent, child etc.),
+    which return the pattern itself, so they can be chained:
+
+        Pattern(formeme='n:1').parent(Pattern(t_lemma='být'))\\
+                              .child(Pattern(formeme='v:rc'))
+
+    A node matches if it satisfies all the attribute constraints and if,
+    for each relation, there is a related node matching the given pattern
+    (or there is none if the relation is negated).
+    """
+
+    # relation: (inverse relation if it is an exact one, relative cost)
+    relations = {'parent': ('child', 1),
+                 'prev': ('next', 1),
+                 'next': ('prev', 1),
+                 'child': ('parent', 2),
+                 'sibling': ('sibling', 3),
+                 'eparent': (None, 3),
+                 'echild': (None, 3),
+                 'ancestor': ('descendant', 4),
+                 'descendant': ('ancestor', 5),
+                 'before': ('after', 6),
+                 'after': ('before', 6)}
+
+    def __init__(self, attrs=None, **kwargs):
+        "Constructor, given the attribute constraints."
+        self.attrs = dict(attrs or {})
+        self.attrs.update(kwargs)
+        self.related = []
+
+    def relate(self, relation, pattern, negate=False):
+        """\
+        Add a node related to this one by the given relation, which must
+        (or, if negate is set, must not) match the given pattern.
+        """
+        if relation not in self.relations:
+            raise RuntimeException('Unknown relation: ' + relation)
+        self.related.append((relation, pattern, negate))
+        return self
+
+    def parent(self, pattern, negate=False):
+        "Add a constraint on the parent of the node."
+        return self.relate('parent', pattern, negate)
+
+    def child(self, pattern, negate=False):
+        "Add a constraint on a child of the node."
+        return self.relate('child', pattern, negate)
+
+    def sibling(self, pattern, negate=False):
+        "Add a constraint on a sibling of the node."
+        return self.relate('sibling', pattern, negate)
+
+    def ancestor(self, pattern, negate=False):
+        "Add a constraint on an ancestor of the node (the root included)."
+        return self.relate('ancestor', pattern, negate)
+
+    def descendant(self, pattern, negate=False):
+        "Add a constraint on a descendant of the node."
+        return self.relate('descendant', pattern, negate)
+
+    def eparent(self, pattern, negate=False):
+        "Add a constraint on an effective parent of the node."
+        return self.relate('eparent', pattern, negate)
+
+    def echild(self, pattern, negate=False):
+        "Add a constraint on an effective child of the node."
+        return self.relate('echild', pattern, negate)
+
+    def prev(self, pattern, negate=False):
+        "Add a constraint on the node immediately preceding in the word order."
+        return self.relate('prev', pattern, negate)
+
+    def next(self, pattern, negate=False):
+        "Add a constraint on the node immediately following in the word order."
+        return self.relate('next', pattern, negate)
+
+    def before(self, pattern, negate=False):
+        "Add a constraint on any node preceding in the word order."
+        return self.relate('before', pattern, negate)
+
+    def after(self, pattern, negate=False):
+        "Add a constraint on any node following in the word order."
+        return self.relate('after', pattern, negate)
+
+    def get_patterns(self):
+        "Return this pattern and all patterns related to it, recursively."
+        patterns = [self]
+        for _, pattern, _ in self.related:
+            patterns.extend(pattern.get_patterns())
+        return patterns
+
+
+class Query(object):
+    """\
+    A query for the nodes of the given layer (in the given zones or all of
+    them, if the language or the selector is None) matching the given
+    pattern.
+
+    The query is planned once: attribute constraints are checked before
+    related nodes, constants before sets and functions, and related nodes
+    are looked up from the cheapest relation (parent, neighbors) to the
+    most expensive one (descendants, nodes before/after). When searching a
+    document, attribute indexes (see Document.add_attr_index) of constant
+    constraints of the pattern or of the nodes related to it are used to
+    find the candidate nodes, so that only they are checked; without such
+    indexes, all nodes of the layer are checked.
+    """
+
+    # relations where index lookups are used instead of related node lists
+    lookup_relations = set(['descendant', 'before', 'after'])
+    # relations over which the candidates may be found from related nodes
+    derive_relations = set(['parent', 'child', 'sibling', 'prev', 'next',
+                            'descendant'])
+
+    def __init__(self, layer, pattern, language=None, selector=None):
+        "Constructor, plan the query."
+        self.layer = layer
+        self.pattern = pattern
+        self.language = language
+        self.selector = selector
+        self.checks = {}
+        for pat in pattern.get_patterns():
+            attrs = sorted(list(pat.attrs.items()),
+                           key=lambda item: self.__get_attr_cost(item[1]))
+            tests = [self.__get_attr_test(attr, value) for attr, value in attrs]
+            related = sorted(pat.related,
+                             key=lambda rel: (rel[2], Pattern.relations[rel[0]][1]))
+            self.checks[id(pat)] = (attrs, tests, related)
+
+    @staticmethod
+    def __get_attr_cost(value):
+        "Return the relative cost of checking the given attribute constraint."
+        if callable(value):
+            return 2
+        if isinstance(value, (set, frozenset, list, tuple)):
+            return 1
+        return 0
+
+    @staticmethod
+    def __get_attr_test(attr, expected):
+        "Return a function testing the given attribute constraint on a node."
+        if attr.split('/')[0].endswith('.rf'):
+            getter = methodcaller('get_attr', attr)
+        elif '/' in attr:
+            name, path = attr.split('/', 1)
+            getter = Query.__get_nested_getter(attrgetter(name), path.split('/'))
+        else:
+            getter = attrgetter(attr)
+        if callable(expected):
+            return lambda node: expected(getter(node))
+        if isinstance(expected, (set, frozenset, list, tuple)):
+            return lambda node: getter(node) in expected
+        return lambda node: getter(node) == expected
+
+    @staticmethod
+    def __get_nested_getter(getter, path):
+        "Return a function reading a nested attribute of a node."
+        def get_nested(node):
+            value = getter(node)
+            try:
+                for step in path:
+                    value = value.get(step)
+            except AttributeError:  # not a dict
+                return None
+            return value
+        return get_nested
+
+    def uses_effective_relations(self):
+        "Return True if the query needs the effective relations of nodes."
+        return any(relation in ('eparent', 'echild')
+                   for pat in self.pattern.get_patterns()
+                   for relation, _, _ in pat.related)
+
+    def find(self, document):
+        """\
+        Yield all nodes of the document matching the query, in the order of
+        bundles and ords. The document should not be changed until all
+        matches have been taken.
+        """
+        context = QueryContext(document)
+        trees = [root for root in self.__get_trees(document)]
+        zones = set(id(root.zone) for root in trees)
+        candidates = self.__get_candidates(self.pattern, context)
+        if candidates is None:
+            for root in trees:
+                nodes = [node for node in root.get_descendants()
+                         if self.matches(node, self.pattern, context)]
+                nodes.sort(key=Ordered.order_key)
+                for node in nodes:
+                    yield node
+            return
+        nodes = [node for node in candidates.values()
+                 if node.parent is not None and id(node.zone) in zones]
+        nodes.sort(key=lambda node: (node.zone.bundle.ord, Ordered.order_key(node)))
+        for node in nodes:
+            if self.matches(node, self.pattern, context):
+                yield node
+
+    def count(self, document):
+        "Return the number of nodes of the document matching the query."
+        return sum(1 for _ in self.find(document))
+
+    def find_in_files(self, filenames, threads=0):
+        """\
+        Yield (filename, node) pairs for all nodes matching the query in the
+        given Treex YAML files, loading and searching the given number of
+        files at a time in parallel threads (one after another if threads
+        is 0). The files are loaded with only the zones needed by the query
+        (if it has a language and a selector), and their trees are read-only
+        columnar trees unless the query uses effective relations.
+        """
+        # imported here, the readers depend on the core, not vice versa
+        from pytreex.block.read.yaml import YAML
+        reader = YAML(None, {'columnar': [] if self.uses_effective_relations()
+                             else [self.layer]})
+        if self.language is not None and self.selector is not None:
+            reader.projection = set([(self.language, self.selector, self.layer)])
+
+        def search(filename):
+            return filename, list(self.find(reader.process_document(filename)))
+        if not threads:
+            for filename in filenames:
+                for node in search(filename)[1]:
+                    yield filename, node
+            return
+        pool = ThreadPool(threads)
+        try:
+            for filename, nodes in pool.imap(search, filenames):
+                for node in nodes:
+                    yield filename, node
+        finally:
+            pool.terminate()
+
+    def __get_trees(self, document):
+        "Yield the trees of the layer in all the queried zones of the document."
+        for bundle in document.bundles:
+            for zone in bundle.get_all_zones():
+                if ((self.language is None or zone.language == self.language) and
+                        (self.selector is None or zone.selector == self.selector) and
+                        zone.has_tree(self.layer)):
+                    yield zone.get_tree(self.layer)
+
+    def __get_candidates(self, pattern, context):
+        """\
+        Return a superset of the nodes (as a dict by id) matching the given
+        pattern, found using attribute indexes, or None if there are no
+        indexes to use.
+        """
+        candidates = context.get_indexed(self.layer, pattern, self.checks)
+        for relation, related, negate in pattern.related:
+            if negate or relation not in self.derive_relations:
+                continue
+            related_candidates = self.__get_candidates(related, context)
+            if related_candidates is None:
+                continue
+            inverse = Pattern.relations[relation][0]
+            derived = {}
+            for node in related_candidates.values():
+                for other in context.get_related(node, inverse):
+                    if self.__matches_attrs(other, pattern):
+                        derived[id(other)] = other
+            if candidates is None:
+                candidates = derived
+            else:
+                candidates = dict((key, node) for key, node in candidates.items()
+                                  if key in derived)
+        return candidates
+
+    def __matches_attrs(self, node, pattern):
+        "Return True if the node satisfies the attribute constraints of the pattern."
+        for test in self.checks[id(pattern)][1]:
+            if not test(node):
+                return False
+        return True
+
+    def matches(self, node, pattern, context):
+        "Return True if the node matches the given pattern."
+        if not self.__matches_attrs(node, pattern):
+            return False
+        for relation, related, negate in self.checks[id(pattern)][2]:
+            others = None
+            if relation in self.lookup_relations:
+                others = context.get_indexed_in_tree(self.layer, related,
+                                                     self.checks, node.root)
+            if others is not None:
+                others = [other for other in others
+                          if context.is_related(node, relation, other)]
+            else:
+                others = context.get_related(node, relation)
+            found = any(self.matches(other, related, context) for other in others)
+            if found == negate:
+                return False
+        return True
+
+
+class QueryContext(object):
+    """\
+    Data kept while searching a document: the candidates from attribute
+    indexes and the word order of trees.
+    """
+
+    def __init__(self, document):
+        "Constructor, given the document searched."
+        self.document = document
+        self.indexed = {}
+        self.indexed_trees = {}
+        self.orders = {}
+
+    def get_indexed(self, layer, pattern, checks):
+        """\
+        Return the nodes (as a dict by id) satisfying the most selective
+        indexed constant constraint of the pattern, or None if there is no
+        such constraint.
+        """
+        key = id(pattern)
+        if key not in self.indexed:
+            best = None
+            for attr, value in checks[key][0]:
+                if (callable(value) or isinstance(value, (set, frozenset, list, tuple)) or
+                        (layer, attr) not in self.document.attr_indexes):
+                    continue
+                nodes = self.document.find_nodes(layer, attr, value)
+                if best is None or len(nodes) < len(best):
+                    best = nodes
+            self.indexed[key] = (None if best is None else
+                                 dict((id(node), node) for node in best))
+        return self.indexed[key]
+
+    def get_indexed_in_tree(self, layer, pattern, checks, root):
+        """\
+        Return the list of nodes of the given tree found by get_indexed, or
+        None if there is no indexed constraint in the pattern.
+        """
+        key = id(pattern)
+        if key not in self.indexed_trees:
+            nodes = self.get_indexed(layer, pattern, checks)
+            trees = None
+            if nodes is not None:
+                trees = {}
+                for node in nodes.values():
+                    trees.setdefault(id(node.root), []).append(node)
+            self.indexed_trees[key] = trees
+        trees = self.indexed_trees[key]
+        if trees is None:
+            return None
+        return trees.get(id(root), [])
+
+    def get_order(self, root):
+        "Return the nodes of the tree in the word order and their positions by id."
+        order = self.orders.get(id(root))
+        if order is None:
+            nodes = sorted(root.get_descendants(), key=Ordered.order_key)
+            positions = dict((id(node), pos) for pos, node in enumerate(nodes))
+            order = self.orders[id(root)] = (nodes, positions)
+        return order
+
+    def get_related(self, node, relation):
+        "Return the list of nodes related to the given one by the given relation."
+        if relation == 'parent':
+            return [] if node.parent is None else [node.parent]
+        if relation == 'child':
+            return node.get_children()
+        if relation == 'sibling':
+            if node.parent is None:
+                return []
+            return [other for other in node.parent.get_children() if other is not node]
+        if relation == 'ancestor':
+            ancestors = []
+            while node.parent is not None:
+                node = node.parent
+                ancestors.append(node)
+            return ancestors
+        if relation == 'descendant':
+            return node.get_descendants()
+        if relation == 'eparent':
+            return node.get_eparents()
+        if relation == 'echild':
+            return node.get_echildren()
+        if node.parent is None:  # the root is not in the word order
+            return []
+        nodes, positions = self.get_order(node.root)
+        pos = positions[id(node)]
+        if relation == 'prev':
+            return nodes[pos - 1:pos] if pos > 0 else []
+        if relation == 'next':
+            return nodes[pos + 1:pos + 2]
+        if relation == 'before':
+            return nodes[:pos]
+        return nodes[pos + 1:]
+
+    def is_related(self, node, relation, other):
+        """\
+        Test whether the other node is related to the given one by the given
+        relation (descendant, before or after).
+        """
+        if other is node:
+            return False
+        if relation == 'descendant':
+            return other.is_descendant_of(node)
+        if (node.parent is None or other.parent is None or
+                other.root is not node.root):
+            return False
+        positions = self.get_order(node.root)[1]
+        if relation == 'before':
+            return positions[id(other)] < positions[id(node)]
+        return positions[id(other)] > positions[id(node)]
@@ -9,12 +9,17 @@ from builtins import zip
 from builtins import str
 from builtins import range
 from builtins import object
+from future import standard_library
+standard_library.install_aliases()
 import getopt
 import yaml
 import sys
 import os.path
+import threading
+from queue import Queue
 from pytreex.core import ScenarioException
 from pytreex.core.log import log_info
+from pytreex.core.util import is_archive, archive_members, SuspendedGC
 from io import StringIO
 
 __author__ = "Ondřej Dušek"
@@ -29,15 +34,24 @@ class Run(object):
     def __init__(self, opts=[]):
         """Initialize the main class by parsing the command arguments
         and creating a scenario object."""
-        optlist, args = getopt.getopt(opts, 'hj:')
+        optlist, args = getopt.getopt(opts, 'ghj:q:t:')
         # no options and no arguments: display usage
         self.help = not optlist and not args
         self.jobs = 0
+        self.queue_depth = 0
+        self.threads = 0
+        self.gc_freeze = False
         for optname, optarg in optlist:
-            if optname == '-h':
+            if optname == '-g':
+                self.gc_freeze = True
+            elif optname == '-h':
                 self.help = True  # explicit usage display
             elif optname == '-j':
                 self.jobs = int(optarg)
+            elif optname == '-q':
+                self.queue_depth = int(optarg)
+            elif optname == '-t':
+                self.threads = int(optarg)
         # store options (not needed?)
         self.optlist = optlist
         # parse scenario, if given
@@ -57,8 +71,8 @@ class Run(object):
             return
         # run the scenario
         self.scenario.load_blocks()
-        for file_name in self.input_files:
-            self.scenario.apply_to(filename=file_name)
+        self.scenario.apply_to_files(self.input_files, self.queue_depth,
+                                     self.threads, self.gc_freeze)
 
     def run_on_cluster(self):
         # split input files for different jobs
@@ -83,7 +97,15 @@ class Run(object):
 
     def print_usage(self):
         print("""\
-        Usage: ./treex.py [-h] [-j jobs] [scenario file1 [file2...]]
+        Usage: ./treex.py [-g] [-h] [-j jobs] [-q depth] [-t threads] [scenario file1 [file2...]]
+
+        -g: freeze the garbage collector after reading each document and
+            tear the documents down explicitly after writing them
+        -j jobs: run in the given number of parallel cluster jobs
+        -q depth: read and write documents in background threads,
+                  keeping at most depth documents waiting in each queue
+        -t threads: process documents in the given number of parallel
+                    threads (writing them in the input order)
         """)
 
 
@@ -110,6 +132,8 @@ class Scenario(object):
                 raise ScenarioException('Data directory must be set')
         else:
             raise ScenarioException('Config or scenario file must be set!')
+        # freeze the GC after reading documents, close them after writing
+        self.gc_freeze = False
         # check whether scenario contains blocks
         if not self.scenario_data:
             raise ScenarioException('No blocks in scenario')
@@ -135,6 +159,250 @@ class Scenario(object):
             self.blocks.append(class_obj(self, args))
             # load models etc.
             self.blocks[-1].load()
+        # let the reader skip zones and layers that no other block needs
+        self.blocks[0].projection = self.get_projection()
+
+    def get_projection(self):
+        """\
+        Return the union of (language, selector, layer) triples required
+        by all blocks following the reader, or None if any of them may
+        need the whole document.
+        """
+        projection = set()
+        for block in self.blocks[1:]:
+            zones = block.get_required_zones()
+            if zones is None:
+                return None
+            projection |= zones
+        return projection
+
+    def apply_to_files(self, filenames, queue_depth=0, threads=0, gc_freeze=False):
+        """\
+        Apply the whole scenario to all the given files (which may also be
+        .tar(.gz)/.zip archives of input files), then let all blocks finish
+        their processing.
+
+        If queue_depth is set, the next input documents are read ahead in
+        a background thread and processed documents are handed over to the
+        final writer blocks running in another background thread. At most
+        queue_depth documents wait in each of the queues, so the memory does
+        not grow without limit if reading or writing is slow.
+
+        If threads is set, documents are processed by a pool of worker
+        threads (see __apply_in_threads); this takes precedence over
+        queue_depth.
+
+        Documents are always read with the garbage collector suspended. If
+        gc_freeze is set, all objects are frozen after reading each document,
+        so that no collection passes over them while the document is being
+        processed, and the documents are torn down explicitly after all
+        blocks (see SuspendedGC and Document.close). No block may keep the
+        documents then.
+        """
+        self.gc_freeze = gc_freeze
+        if threads:
+            self.__apply_in_threads(filenames, threads)
+        elif queue_depth:
+            self.__apply_in_stages(filenames, queue_depth)
+        else:
+            for doc in self.read_documents(filenames):
+                self.__apply_blocks(doc, 2, len(self.blocks))
+                self.__finish_document(doc)
+        for block in self.blocks:
+            block.process_end()
+
+    def read_documents(self, filenames):
+        """\
+        Read the given files using the first block of the scenario, yielding
+        the documents. Files contained in .tar(.gz)/.zip archives are read
+        directly from the archive and named as if they were extracted next
+        to it.
+        """
+        for filename in filenames:
+            if not is_archive(filename):
+                yield self.__read_document(filename, filename)
+                continue
+            log_info('Reading archive ' + filename)
+            archive_dir = os.path.dirname(filename)
+            for member_name, fh in archive_members(filename):
+                yield self.__read_document(fh, os.path.join(archive_dir, member_name))
+
+    def __read_document(self, source, filename):
+        "Read one document from a file name or stream, using the first block."
+        log_info('Processing ' + filename)
+        log_info('Applying block 1/' + str(len(self.blocks)) + ': ' +
+                 self.blocks[0].__class__.__name__)
+        with SuspendedGC(freeze=self.gc_freeze):
+            doc = self.blocks[0].process_document(source)
+        doc.filename = filename
+        return doc
+
+    def __finish_document(self, doc):
+        "Tear the document down after all blocks, if required (see apply_to_files)."
+        if self.gc_freeze:
+            doc.close()
+
+    def __apply_in_stages(self, filenames, queue_depth):
+        """\
+        Apply the scenario with reading and writing in background threads
+        (see apply_to_files).
+        """
+        # split off the writer blocks at the end of the scenario
+        first_writer = self.__get_first_writer()
+        # start the reading and writing stages
+        input_docs = Queue(queue_depth)
+        output_docs = Queue(queue_depth)
+        write_errors = []
+        self.__start_stage(self.__read_ahead, filenames, input_docs)
+        writer = self.__start_stage(self.__write_behind, output_docs,
+                                    first_writer, write_errors)
+        # process the documents in the main thread; on error, still let the
+        # writers finish the documents processed so far
+        try:
+            while True:
+                doc = input_docs.get()
+                if doc is None:
+                    break
+                if isinstance(doc, Exception):
+                    raise doc
+                self.__apply_blocks(doc, 2, first_writer)
+                output_docs.put(doc)
+                if write_errors:
+                    raise write_errors[0]
+        finally:
+            output_docs.put(None)
+            writer.join()
+        if write_errors:
+            raise write_errors[0]
+
+    def __get_first_writer(self):
+        """\
+        Return the number of the last block before the writer blocks at the
+        end of the scenario (counting from 1, the reader is never included).
+        """
+        from pytreex.block.write.basewriter import BaseWriter
+        first_writer = len(self.blocks)
+        while first_writer > 1 and isinstance(self.blocks[first_writer - 1], BaseWriter):
+            first_writer -= 1
+        return first_writer
+
+    def __apply_in_threads(self, filenames, threads):
+        """\
+        Apply the scenario with a pool of worker threads (see apply_to_files).
+
+        Documents are read in the main thread and processed by the workers
+        with all blocks except the final writers, which are applied in the
+        main thread, in the order of the input documents. Blocks are shared
+        by the workers, so they must not keep any per-document state (the
+        core only guarantees safety for separate documents). At most
+        2 * threads documents are being processed or waiting to be written
+        at a time.
+        """
+        first_writer = self.__get_first_writer()
+        tasks = Queue()
+        finished = {}
+        finished_cond = threading.Condition()
+        for _ in range(threads):
+            self.__start_stage(self.__process_tasks, tasks, finished,
+                               finished_cond, first_writer)
+        read = written = 0
+        try:
+            for doc in self.read_documents(filenames):
+                tasks.put((read, doc))
+                read += 1
+                # write out what is finished, wait if too much is pending
+                written = self.__write_finished(finished, finished_cond, written,
+                                                first_writer, read - written >= 2 * threads)
+            while written < read:
+                written = self.__write_finished(finished, finished_cond, written,
+                                                first_writer, True)
+        finally:
+            for _ in range(threads):
+                tasks.put(None)
+
+    def __process_tasks(self, tasks, finished, finished_cond, first_writer):
+        """\
+        Process documents from the task queue with all blocks except the
+        writers, passing them (or the errors raised) on to the main thread
+        (run in worker threads).
+        """
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            doc_no, doc = task
+            try:
+                self.__apply_blocks(doc, 2, first_writer)
+            except Exception as e:
+                doc = e
+            with finished_cond:
+                finished[doc_no] = doc
+                finished_cond.notify_all()
+
+    def __write_finished(self, finished, finished_cond, written, first_writer, wait):
+        """\
+        Apply the writer blocks to all documents that are finished and next
+        in the input order, optionally waiting for the next one to finish.
+        Return the new number of documents written.
+        """
+        docs = []
+        with finished_cond:
+            while wait and written not in finished:
+                finished_cond.wait()
+            while written + len(docs) in finished:
+                docs.append(finished.pop(written + len(docs)))
+        for doc in docs:
+            if isinstance(doc, Exception):
+                raise doc
+            self.__apply_blocks(doc, first_writer + 1, len(self.blocks))
+            self.__finish_document(doc)
+            written += 1
+        return written
+
+    def __start_stage(self, target, *args):
+        "Start a background processing stage in a new thread."
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def __read_ahead(self, filenames, input_docs):
+        "Read all input documents into a queue (run in a background thread)."
+        try:
+            for doc in self.read_documents(filenames):
+                input_docs.put(doc)
+            input_docs.put(None)
+        except Exception as e:
+            input_docs.put(e)
+
+    def __write_behind(self, output_docs, first_writer, write_errors):
+        """\
+        Apply the writer blocks to all processed documents in the queue
+        (run in a background thread). On error, keep consuming the documents
+        so that the main thread is not blocked.
+        """
+        while True:
+            doc = output_docs.get()
+            if doc is None:
+                return
+            if write_errors:
+                continue
+            try:
+                self.__apply_blocks(doc, first_writer + 1, len(self.blocks))
+                self.__finish_document(doc)
+            except Exception as e:
+                write_errors.append(e)
+
+    def __apply_blocks(self, doc, first_no, end_no):
+        """\
+        Apply blocks to the document, starting with the given block
+        number (counting from 1) up to the given number (inclusive).
+        """
+        for block_no in range(first_no, end_no + 1):
+            block = self.blocks[block_no - 1]
+            log_info('Applying block ' + str(block_no) + '/' +
+                     str(len(self.blocks)) + ': ' + block.__class__.__name__)
+            block.process_document(doc)
 
     def apply_to(self, filename=None, string=None, language=None, selector=None):
         """
@@ -148,10 +416,7 @@ class Scenario(object):
                      self.blocks[0].__class__.__name__)
             doc = self.blocks[0].process_document(filename)
             # apply all other blocks
-            for block_no, block in enumerate(self.blocks[1:], start=2):
-                log_info('Applying block ' + str(block_no) + '/' +
-                         str(len(self.blocks)) + ': ' + block.__class__.__name__)
-                block.process_document(doc)
+            self.__apply_blocks(doc, 2, len(self.blocks))
         elif string is not None:
             # check if we know the target language and selector
             language = language or self.global_args.get['language']
@@ -160,10 +425,7 @@ class Scenario(object):
             fh = StringIO(string)
             doc = self.blocks[0].process_document(fh)
             # apply all other blocks
-            for block_no, block in enumerate(self.blocks[1:], start=2):
-                log_info('Applying block ' + str(block_no) + '/' +
-                         str(len(self.blocks)) + ': ' + block.__class__.__name__)
-                block.process_document(doc)
+            self.__apply_blocks(doc, 2, len(self.blocks))
             # return the text of all bundles for the specified sentence
             return "\n".join([b.get_zone(language, selector).sentence
                               for b in doc.bundles])
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Export of node attributes of many trees into tables of columns
+#
+from __future__ import unicode_literals
+from builtins import zip
+from builtins import map
+from builtins import range
+from builtins import object
+from operator import attrgetter, methodcaller
+from pytreex.core.exception import RuntimeException
+from pytreex.core.node import Ordered
+import pytreex.core.node
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for table exports
+    np = None
+
+
+class TableExport(object):
+    """\
+    Export of the attributes of the nodes of many trees into tables with one
+    row per node (roots are left out), in the order of bundles and ords.
+
+    Each table is a dict of NumPy arrays with the following columns:
+        bundle: the index of the node's bundle in the document
+        token: the index of the node within its tree
+        parent: the token index of the node's parent (-1 for the root)
+        depth: the distance of the node from the root
+        ord: the node's ord (-1 if not set)
+    and one for each of the requested attributes (nested ones such as
+    'morphcat/pos' are allowed): values of boolean and integer attributes
+    (-1 for integers not set), integer codes of all other (hashable) values
+    (-1 for None). The codes are kept for the whole export, so they are the
+    same in all tables; get_vocabulary returns the values they stand for.
+
+    The trees are added one by one (or a document at a time), and the table
+    of all rows added so far is taken out with get_table, so any number of
+    documents may be streamed through one export.
+    """
+
+    structure = ['bundle', 'token', 'parent', 'depth', 'ord']
+
+    def __init__(self, layer, attrs):
+        "Constructor, given the layer of the trees and a list of attributes."
+        if np is None:
+            raise RuntimeException('NumPy is required for table exports')
+        self.layer = layer
+        # (the structure columns are always there)
+        self.attrs = [attr for attr in attrs if attr not in self.structure]
+        node_class = getattr(pytreex.core.node, layer.upper())
+        prototype = node_class.__new__(node_class)
+        types = dict(prototype.get_attr_list(include_types=True))
+        safe_names = dict(zip(prototype.get_attr_list(),
+                              prototype.get_attr_list(safe=True)))
+        self.getters = dict((attr, self.__get_getter(attr, safe_names))
+                            for attr in self.attrs)
+        # bool or int for numeric attributes, None for coded ones
+        self.types = dict((attr, types[attr] if types.get(attr) in (bool, int) else None)
+                          for attr in self.attrs)
+        self.codes = dict((attr, {}) for attr in self.attrs
+                          if self.types[attr] is None)
+        self.__reset()
+
+    @staticmethod
+    def __get_getter(attr, safe_names):
+        "Return a function reading the given (possibly nested) attribute of a node."
+        name, path = (attr.split('/', 1) + [None])[:2]
+        if name not in safe_names:
+            return methodcaller('get_attr', attr)
+        getter = attrgetter(safe_names[name])
+        if path is None:
+            return getter
+        path = path.split('/')
+
+        def get_nested(node):
+            value = getter(node)
+            try:
+                for step in path:
+                    value = value.get(step)
+            except AttributeError:  # not a dict
+                return None
+            return value
+        return get_nested
+
+    def __reset(self):
+        "Start collecting new rows."
+        self.rows = dict((column, []) for column in self.structure + self.attrs)
+
+    def __len__(self):
+        "Return the number of rows collected so far."
+        return len(self.rows['token'])
+
+    def add_tree(self, root):
+        "Add all nodes of the given tree."
+        rows = self.rows
+        zone = root.zone
+        bundle = zone.bundle.ord - 1 if zone is not None and zone.bundle else -1
+        nodes = root.get_descendants()
+        # descendants come depth-first, i.e. parents before their children
+        depths = {id(root): 0}
+        for node in nodes:
+            depths[id(node)] = depths[id(node.parent)] + 1
+        nodes.sort(key=Ordered.order_key)
+        tokens = dict((id(node), token) for token, node in enumerate(nodes))
+        tokens[id(root)] = -1
+        rows['bundle'].extend([bundle] * len(nodes))
+        rows['token'].extend(range(len(nodes)))
+        rows['parent'].extend(tokens[id(node.parent)] for node in nodes)
+        rows['depth'].extend(depths[id(node)] for node in nodes)
+        rows['ord'].extend(-1 if node.ord is None else node.ord for node in nodes)
+        for attr in self.attrs:
+            values = list(map(self.getters[attr], nodes))
+            if self.types[attr] is bool:
+                rows[attr].extend(bool(value) for value in values)
+            elif self.types[attr] is int:
+                rows[attr].extend(-1 if value is None else value for value in values)
+            else:
+                codes = self.codes[attr]
+                rows[attr].extend(-1 if value is None else
+                                  codes.setdefault(value, len(codes))
+                                  for value in values)
+
+    def add_document(self, document, language, selector=''):
+        "Add the trees of the given zone in all bundles of the document."
+        for root in self.__get_trees(document, language, selector):
+            self.add_tree(root)
+
+    def iter_tables(self, documents, language, selector='', chunk_rows=100000):
+        """\
+        Stream the trees of the given zone in all the given documents (any
+        iterable) through the export, yielding a table whenever at least
+        chunk_rows rows have been collected, and a table of the rest at the
+        end.
+        """
+        for document in documents:
+            for root in self.__get_trees(document, language, selector):
+                self.add_tree(root)
+                if len(self) >= chunk_rows:
+                    yield self.get_table()
+        if len(self):
+            yield self.get_table()
+
+    def __get_trees(self, document, language, selector):
+        "Yield the trees of the given zone in all bundles of the document."
+        for bundle in document.bundles:
+            if bundle.has_zone(language, selector):
+                zone = bundle.get_zone(language, selector)
+                if zone.has_tree(self.layer):
+                    yield zone.get_tree(self.layer)
+
+    def get_table(self):
+        "Return the table of all rows added since the last call."
+        rows = self.rows
+        self.__reset()
+        table = dict((column, np.array(rows[column], dtype=np.int32))
+                     for column in ['bundle', 'token', 'parent', 'depth'])
+        table['ord'] = np.array(rows['ord'], dtype=np.int64)
+        for attr in self.attrs:
+            dtype = {bool: np.bool_, int: np.int64}.get(self.types[attr], np.int32)
+            table[attr] = np.array(rows[attr], dtype=dtype)
+        return table
+
+    def get_vocabulary(self, attr):
+        "Return the list of the values of the given coded attribute, by code."
+        vocabulary = [None] * len(self.codes[attr])
+        for value, code in self.codes[attr].items():
+            vocabulary[code] = value
+        return vocabulary
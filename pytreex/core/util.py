@@ -5,10 +5,30 @@
 #
 
 from __future__ import unicode_literals
+from future import standard_library
+standard_library.install_aliases()
+from builtins import str
+from builtins import object
 import codecs
+import gc
 import gzip
-from io import IOBase
+import os
+import pickle
+import re
+import tarfile
+import threading
+import zipfile
+import zlib
+from array import array
+from collections import deque
+from queue import Queue
+from io import IOBase, RawIOBase, BufferedReader, BytesIO
 from codecs import StreamReader, StreamWriter
+from pytreex.core.exception import RuntimeException
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
 
 __author__ = "Ondřej Dušek"
 __date__ = "2012"
@@ -35,18 +55,183 @@ def as_list(value):
     return [value]
 
 
-def file_stream(filename, mode='r', encoding='UTF-8'):
+class SymbolTable(object):
+    """\
+    Interning of strings from a small vocabulary (e.g. values of categorical
+    node attributes): all equal strings are replaced by one shared instance,
+    which saves memory and makes comparing equal values faster.
+    """
+
+    def __init__(self):
+        self.symbols = {}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def intern(self, value):
+        "Return the shared instance of the given string (other values are kept)."
+        if not isinstance(value, str):
+            return value
+        return self.symbols.setdefault(value, value)
+
+    def intern_values(self, values):
+        "Intern all string values of the given dict (in place), return it."
+        for key, value in values.items():
+            if isinstance(value, str):
+                values[key] = self.symbols.setdefault(value, value)
+        return values
+
+
+class SuspendedGC(object):
+    """\
+    Context manager suspending the cyclic garbage collector while large
+    structures (e.g. documents, whose nodes are full of reference cycles)
+    are being built, since collecting would only pass repeatedly over new
+    objects that are all alive. The suspensions are counted, so they may be
+    nested and used in parallel threads; the collector is enabled again when
+    the last one ends.
+
+    If freeze is set, all objects existing when the last suspension ends are
+    moved to the permanent generation (gc.freeze, Python 3.7+), so that no
+    later collection passes over them. They are only freed by reference
+    counting then, i.e. documents must be closed (Document.close).
+    """
+
+    lock = threading.Lock()
+    count = 0
+    enabled = True
+    freeze_requested = False
+
+    def __init__(self, freeze=False):
+        self.freeze = freeze
+
+    def __enter__(self):
+        cls = SuspendedGC
+        with cls.lock:
+            if cls.count == 0:
+                cls.enabled = gc.isenabled()
+                gc.disable()
+            cls.count += 1
+            cls.freeze_requested = cls.freeze_requested or self.freeze
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        cls = SuspendedGC
+        with cls.lock:
+            cls.count -= 1
+            if cls.count == 0:
+                if cls.freeze_requested and hasattr(gc, 'freeze'):
+                    gc.freeze()
+                cls.freeze_requested = False
+                if cls.enabled:
+                    gc.enable()
+        return False
+
+
+class StringTable(object):
+    """\
+    Coding of strings as integers, for compact serialization: each distinct
+    string is coded by its position in the list of strings of the table.
+    """
+
+    def __init__(self, strings=None):
+        self.strings = list(strings or [])
+        self.codes = dict((string, code) for code, string in enumerate(self.strings))
+        # shared instances of the strings, by code (see decode)
+        self.interned = {}
+
+    def encode(self, values):
+        """\
+        Return an array (of type 'i') of the codes of the given strings (-1
+        for None), or None if not all the values are strings or None.
+        """
+        codes = self.codes
+        strings = self.strings
+        result = array(str('i'))
+        for value in values:
+            if value is None:
+                result.append(-1)
+                continue
+            if not isinstance(value, str):
+                return None
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(strings)
+                strings.append(value)
+            result.append(code)
+        return result
+
+    def decode(self, codes, symbols=None):
+        """\
+        Return the list of strings (None for -1) coded by the given codes,
+        shared instances from the given SymbolTable if it is set.
+        """
+        strings = self.strings
+        if symbols is None:
+            return [None if code < 0 else strings[code] for code in codes]
+        interned = self.interned
+        values = []
+        for code in codes:
+            value = None
+            if code >= 0:
+                value = interned.get(code)
+                if value is None:
+                    value = interned[code] = symbols.intern(strings[code])
+            values.append(value)
+        return values
+
+
+class SharedPickle(object):
+    """\
+    An object pickled into shared memory (multiprocessing.shared_memory,
+    Python 3.8+), for passing large objects such as documents to other
+    processes: only this small handle is sent (e.g. through a queue), and
+    the receiving process unpickles the object directly from the shared
+    memory with load(), which also frees the memory.
+    """
+
+    def __init__(self, obj, protocol=pickle.HIGHEST_PROTOCOL):
+        if shared_memory is None:
+            raise RuntimeException('Shared memory is not available (Python 3.8+ required)')
+        data = pickle.dumps(obj, protocol)
+        block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        block.buf[:len(data)] = data
+        self.name = block.name
+        self.size = len(data)
+        block.close()
+
+    def load(self, unlink=True):
+        "Unpickle the object; free the shared memory unless unlink is False."
+        block = shared_memory.SharedMemory(name=self.name)
+        try:
+            return pickle.loads(block.buf[:self.size])
+        finally:
+            block.close()
+            if unlink:
+                block.unlink()
+
+
+def file_stream(filename, mode='r', encoding='UTF-8', threads=0):
     """\
     Given a file stream or a file name, return the corresponding stream,
     handling GZip. Depending on mode, open an input or output stream.
+
+    If threads is set, GZip files are compressed in parallel blocks using
+    the given number of threads (for output), or decompressed ahead in a
+    background thread (for input).
     """
-    # open file
+    # open file (always in binary mode, text is handled by codecs below)
     if isinstance(filename, (IOBase, StreamReader, StreamWriter)):
         fh = filename
     elif filename.endswith('.gz'):
-        fh = gzip.open(filename, mode)
+        if threads and mode.startswith('r'):
+            fh = BufferedReader(ReadAheadGzipReader(filename))
+        elif threads:
+            fh = ParallelGzipWriter(filename, threads, mode=mode)
+        else:
+            fh = gzip.open(filename, mode)
     else:
-        fh = open(filename, mode)
+        fh = open(filename, mode if 'b' in mode else mode + 'b')
     # support encodings
     if encoding is not None:
         if mode.startswith('r'):
@@ -54,3 +239,280 @@ def file_stream(filename, mode='r', encoding='UTF-8'):
         else:
             fh = codecs.getwriter(encoding)(fh)
     return fh
+
+
+def gzip_compress(data, level=6):
+    """\
+    Compress the given bytes into one GZip member (with no time stamp, so
+    that the output only depends on the data).
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipWriter(RawIOBase):
+    """\
+    A binary output stream that compresses blocks of data independently
+    in a pool of threads (zlib releases the GIL), producing a standard
+    multi-member GZip file.
+    """
+
+    def __init__(self, filename, threads=4, block_size=1 << 20, level=6, mode='wb'):
+        """\
+        Open the given file for writing (or appending, depending on mode),
+        compress blocks of block_size bytes using the given number of
+        threads.
+        """
+        self.fh = open(filename, mode if 'b' in mode else mode + 'b')
+        self.block_size = block_size
+        self.level = level
+        self.buffer = bytearray()
+        self.tasks = Queue()
+        self.workers = []
+        for _ in range(threads):
+            worker = threading.Thread(target=self.__compress_blocks)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+        # compressed blocks waiting to be written out in order (each in a
+        # one-item queue); bounded, so that the memory does not grow if the
+        # disk is too slow
+        self.pending = deque()
+        self.max_pending = 2 * threads
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        "Buffer the data, submit all full blocks for compression."
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.block_size:
+            self.__submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def __compress_blocks(self):
+        "Compress blocks from the task queue (run in worker threads)."
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            block, result = task
+            try:
+                result.put(gzip_compress(block, self.level))
+            except Exception as e:
+                result.put(e)
+
+    def __submit(self, block):
+        "Submit a block for compression, write out finished blocks."
+        result = Queue(1)
+        self.tasks.put((block, result))
+        self.pending.append(result)
+        while len(self.pending) > self.max_pending:
+            self.__write_next()
+
+    def __write_next(self):
+        "Wait for the next compressed block and write it out."
+        data = self.pending.popleft().get()
+        if isinstance(data, Exception):
+            raise data
+        self.fh.write(data)
+
+    def flush(self):
+        "Compress and write out all data written so far."
+        if self.fh.closed:
+            return
+        if self.buffer:
+            self.__submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self.__write_next()
+        self.fh.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            for _ in self.workers:
+                self.tasks.put(None)
+            self.fh.close()
+            RawIOBase.close(self)
+
+
+class ReadAheadGzipReader(RawIOBase):
+    """\
+    A binary input stream that decompresses a GZip file in a background
+    thread, so that decompression overlaps with parsing. Should be wrapped
+    in a BufferedReader for efficient line reading.
+    """
+
+    def __init__(self, filename, chunk_size=1 << 20, depth=4):
+        """\
+        Start decompressing the given file in chunks of chunk_size bytes,
+        keeping at most depth chunks ready.
+        """
+        self.chunk_size = chunk_size
+        self.queue = Queue(depth)
+        self.chunk = b''
+        self.offset = 0
+        self.eof = False
+        self.stopped = False
+        self.thread = threading.Thread(target=self.__read_ahead,
+                                       args=(filename,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __read_ahead(self, filename):
+        "Decompress the file chunk by chunk (run in the background thread)."
+        try:
+            with gzip.open(filename, 'rb') as fh:
+                while not self.stopped:
+                    chunk = fh.read(self.chunk_size)
+                    self.queue.put(chunk)
+                    if not chunk:
+                        break
+        except Exception as e:
+            self.queue.put(e)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        "Fill the given buffer with decompressed data, return its length."
+        while self.offset >= len(self.chunk):
+            if self.eof:
+                return 0
+            chunk = self.queue.get()
+            if isinstance(chunk, Exception):
+                self.eof = True
+                raise chunk
+            if not chunk:
+                self.eof = True
+                return 0
+            self.chunk, self.offset = chunk, 0
+        size = min(len(buf), len(self.chunk) - self.offset)
+        buf[:size] = self.chunk[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+    def close(self):
+        if self.closed:
+            return
+        # stop the background thread, unblocking it if the queue is full
+        self.stopped = True
+        while self.thread.is_alive():
+            while not self.queue.empty():
+                self.queue.get()
+            self.thread.join(0.01)
+        RawIOBase.close(self)
+
+
+ARCHIVE_EXTENSIONS = re.compile(r'(\.tar|\.tar\.gz|\.tgz|\.zip)$')
+
+
+def is_archive(filename):
+    "Return True if the given file name is a .tar, .tar.gz, .tgz or .zip archive."
+    return bool(ARCHIVE_EXTENSIONS.search(filename))
+
+
+def archive_members(filename):
+    """\
+    Iterate over all regular files in a .tar(.gz) or .zip archive, yielding
+    their names and binary input streams (GZipped members are decompressed).
+    Each stream is only valid until the next member is requested.
+    """
+    if filename.endswith('.zip'):
+        archive = zipfile.ZipFile(filename)
+        members = ((info.filename, archive.open(info))
+                   for info in archive.infolist()
+                   if not info.filename.endswith('/'))
+    else:
+        # stream mode, the archive is read strictly sequentially
+        archive = tarfile.open(filename, 'r|*')
+        members = ((info.name, archive.extractfile(info))
+                   for info in archive if info.isfile())
+    try:
+        for name, fh in members:
+            if name.endswith('.gz'):
+                fh = gzip.GzipFile(fileobj=fh, mode='rb')
+            yield name, fh
+    finally:
+        archive.close()
+
+
+class ArchiveShardWriter(object):
+    """\
+    Writes files into a sequence of .tar(.gz) or .zip archives, starting a new
+    archive (shard) whenever the current one would exceed the given size.
+    The shards are named after the given file name template, with a shard
+    number inserted before the extension (out.tar.gz -> out-00001.tar.gz).
+    """
+
+    def __init__(self, template, shard_size=1 << 30):
+        "Initialize, the first shard is opened on the first write."
+        match = ARCHIVE_EXTENSIONS.search(template)
+        if not match:
+            raise ValueError('Unknown archive type: ' + template)
+        self.prefix = template[:match.start()]
+        self.extension = match.group(1)
+        self.shard_size = shard_size
+        self.shard_no = 0
+        self.archive = None
+        self.size = 0
+
+    def __open_shard(self):
+        "Close the current shard and open the next one."
+        self.close()
+        self.shard_no += 1
+        filename = '%s-%05d%s' % (self.prefix, self.shard_no, self.extension)
+        if self.extension == '.zip':
+            self.archive = zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED)
+        elif self.extension == '.tar':
+            self.archive = tarfile.open(filename, 'w')
+        else:
+            self.archive = tarfile.open(filename, 'w:gz')
+        self.size = 0
+
+    def add(self, name, data):
+        "Add a file with the given name and contents (bytes) to the archive."
+        if name.endswith('.gz'):
+            data = gzip_compress(data)
+        if self.archive is None or (self.size and
+                                    self.size + len(data) > self.shard_size):
+            self.__open_shard()
+        if self.extension == '.zip':
+            self.archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            self.archive.addfile(info, BytesIO(data))
+        self.size += len(data)
+
+    def open(self, name):
+        """\
+        Return a binary output stream for a file of the given name; the file
+        is added to the archive when the stream is closed.
+        """
+        return ArchiveMemberStream(self, name)
+
+    def close(self):
+        "Close the current shard."
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+
+class ArchiveMemberStream(BytesIO):
+    "In-memory output stream, added to an archive when closed."
+
+    def __init__(self, archive, name):
+        BytesIO.__init__(self)
+        self.archive = archive
+        self.name = name
+
+    def close(self):
+        if not self.closed:
+            self.archive.add(self.name, self.getvalue())
+        BytesIO.close(self)
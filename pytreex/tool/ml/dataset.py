@@ -13,12 +13,13 @@ from builtins import range
 from past.builtins import basestring
 from builtins import object
 import re
+import io
 import numpy as np
 import scipy.sparse as sp
 import copy
 from sklearn.datasets.base import Bunch
 import math
-from pytreex.core.util import file_stream
+from pytreex.core.util import file_stream, SuspendedGC
 
 __author__ = "Ondřej Dušek"
 __date__ = "2012"
@@ -196,6 +197,12 @@ class DataSet(object):
                   r'"[^"]*(\\"[^"]*)*(?<!\\)"),'
     # ARFF special characters for regexps
     SPEC_CHARS = r'[\n\r\'"\\\t%]'
+    # Regex matching an ARFF dense instance line that may be simply split
+    # at commas (no quoted values or empty fields), with an optional weight
+    PLAIN_LINE = re.compile(r'^([^\'"{},]+(?:,[^\'"{},]+)*)' +
+                            r'(?:,\s*\{([0-9]+(?:\.[0-9]*)?|\.[0-9]+)\})?$')
+    # Regex matching ARFF header lines
+    HEADER_LINE = re.compile(r'@(relation|attribute|data)', re.IGNORECASE)
 
     def __init__(self):
         """
@@ -277,48 +284,65 @@ class DataSet(object):
                      target=y,
                      target_names=self.attribs[target].labels)
 
-    def load_from_arff(self, filename, encoding='UTF-8'):
+    def load_from_arff(self, filename, encoding='UTF-8', chunk_size=10000):
         """
         Load an ARFF file/stream, filling the data structures.
+
+        Data lines are parsed in chunks of the given number of lines; plain
+        dense lines are converted all at once (see __parse_lines).
         """
         # initialize
         if not self.is_empty:
             raise IOError('Cannot store second data set into the same object.')
+        # open the file (decoding by the faster io module for file names)
+        if isinstance(filename, basestring):
+            fh = io.TextIOWrapper(file_stream(filename, encoding=None), encoding=encoding)
+        else:
+            fh = file_stream(filename, encoding=encoding)
+        # parse the file (no garbage collection needed for the new instances)
+        with SuspendedGC():
+            self.__read_arff(fh, chunk_size)
+        fh.close()
+        # remember attribute names
+        self.attribs_by_name = {attr.name: idx
+                                for idx, attr in enumerate(self.attribs)}
+
+    def __read_arff(self, fh, chunk_size):
+        """
+        Read the ARFF header and data from an open stream.
+        """
         status = 'header'  # we first assume to read the header
         line_num = 1  # line counter
         instances = []
         weights = []
-        # open the file
-        fh = file_stream(filename, encoding=encoding)
-        # parse the file
+        chunk = []
         for line in fh:
             line = line.strip()
             # skip comments
             if line.startswith('%'):
                 continue
-            # relation name
-            elif line.lower().startswith('@relation'):
-                self.relation_name = line.split(None, 1)[1]
-            # attribute definition
-            elif line.lower().startswith('@attribute'):
-                attr_name, attr_type = line.split(None, 2)[1:]
-                self.attribs.append(Attribute(attr_name, attr_type))
-            # data section start
-            elif line.lower().startswith('@data'):
-                status = 'data'
+            elif line.startswith('@') and self.HEADER_LINE.match(line):
+                # relation name
+                if line.lower().startswith('@relation'):
+                    self.relation_name = line.split(None, 1)[1]
+                # attribute definition
+                elif line.lower().startswith('@attribute'):
+                    attr_name, attr_type = line.split(None, 2)[1:]
+                    self.attribs.append(Attribute(attr_name, attr_type))
+                # data section start
+                else:
+                    status = 'data'
             # data lines
             elif status == 'data' and line != '':
-                inst, weight = self.__parse_line(line, line_num)
-                instances.append(inst)
-                weights.append(weight)
+                chunk.append((line, line_num))
+                if len(chunk) >= chunk_size:
+                    self.__parse_lines(chunk, instances, weights)
+                    chunk = []
             line_num += 1
-        fh.close()
+        self.__parse_lines(chunk, instances, weights)
         # store the resulting matrix
         self.data = instances
         self.inst_weights = weights
-        # remember attribute names
-        self.attribs_by_name = {attr.name: idx
-                                for idx, attr in enumerate(self.attribs)}
 
     def save_to_arff(self, filename, encoding='UTF-8'):
         """
@@ -772,6 +796,71 @@ class DataSet(object):
             self.data = []
         return ret
 
+    def __parse_lines(self, lines, instances, weights):
+        """
+        Parse a chunk of ARFF data lines (with their line numbers), appending
+        the instances and weights to the given lists. Runs of plain dense
+        lines with the right number of fields are converted all at once,
+        other lines one by one.
+        """
+        num_fields = len(self.attribs)
+        plain = []
+        for line, line_num in lines + [(None, None)]:
+            match = line is not None and self.PLAIN_LINE.match(line)
+            if match:
+                fields, weight = match.groups()
+                if fields.count(',') == num_fields - 1:
+                    plain.append((line, line_num, fields, weight))
+                    continue
+            if plain:
+                try:
+                    instances.extend(self.__parse_plain_lines(
+                            [fields for _, _, fields, _ in plain]))
+                    weights.extend(1.0 if weight is None else float(weight)
+                                   for _, _, _, weight in plain)
+                except ValueError:
+                    # let the line-by-line parsing find and report the error
+                    for plain_line, plain_num, _, _ in plain:
+                        inst, weight = self.__parse_line(plain_line, plain_num)
+                        instances.append(inst)
+                        weights.append(weight)
+                plain = []
+            if line is not None:
+                inst, weight = self.__parse_line(line, line_num)
+                instances.append(inst)
+                weights.append(weight)
+
+    def __parse_plain_lines(self, lines):
+        """
+        Parse plain dense ARFF data lines (without weights) at once, as a
+        NumPy array of fields; return the list of instances. Raise a
+        ValueError for invalid values (before any string values are
+        added to attributes, if the numeric ones are invalid).
+        """
+        fields = np.array([line.split(',') for line in lines])
+        # undefined values are checked before stripping, as in __parse_line
+        missing = fields == '?'
+        if any(' ' in line or '\t' in line for line in lines):
+            fields = np.char.strip(fields)
+        values = np.empty(fields.shape)
+        # numeric values first (these cannot change the attributes)
+        for col, attr in enumerate(self.attribs):
+            if attr.type == 'numeric':
+                values[:, col] = np.where(missing[:, col], 'nan', fields[:, col]).astype(float)
+        # look up each distinct nominal/string value once, in the order of
+        # appearance (so that new string values are numbered as line by line)
+        for col, attr in enumerate(self.attribs):
+            if attr.type != 'numeric':
+                present = ~missing[:, col]
+                uniq, first, inverse = np.unique(fields[present, col], return_index=True,
+                                                 return_inverse=True)
+                codes = np.empty(len(uniq))
+                for idx in np.argsort(first, kind='stable'):
+                    codes[idx] = attr.numeric_value(str(uniq[idx]))
+                values[:, col] = float('NaN')
+                values[present, col] = codes[inverse]
+        return values.tolist()
+
     def __parse_line(self, line, line_num):
         """"
         Parse one ARFF data line (dense or sparse, return appropriate